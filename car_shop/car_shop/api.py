@@ -1,11 +1,14 @@
-from ninja import NinjaAPI
+from car_shop.renderers import NegotiatingNinjaAPI
 
 from product.api import router as product_router
 from user.api import router as user_router
 from sale.api import router as sales_router
 from shop.api import router as shop_router
+from car_shop.response import ResponseSchema
+from car_shop.cache import response_cache
+from utils import AuthBearer, token_cache
 
-api = NinjaAPI(
+api = NegotiatingNinjaAPI(
     title = "Car Shop",
     description = "Car Shop Management",
     urls_namespace="api"
@@ -14,4 +17,14 @@ api = NinjaAPI(
 api.add_router("/", router = product_router)
 api.add_router("/", router = user_router)
 api.add_router("/", router = sales_router)
-api.add_router("/", router = shop_router)
\ No newline at end of file
+api.add_router("/", router = shop_router)
+
+@api.get("metrics", response=ResponseSchema, auth=AuthBearer(), tags=["Metrics"])
+async def get_metrics(request):
+    """
+    **In-process cache metrics of this worker**
+    """
+    response = ResponseSchema()
+    response.data.append({"token_cache": token_cache.stats(),
+                          "response_cache": response_cache.stats()})
+    return response
@@ -0,0 +1,283 @@
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+from django.db.models import Model
+
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+import json
+import pickle
+import time
+
+
+class LRUStore:
+    """
+    Entries and counters of one `LRUMemoryCache`, shared by every thread of the process
+    """
+
+    def __init__(self):
+        # key -> (pickled value, expiry timestamp or None)
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+
+# Django creates one backend instance per thread, the store is shared by cache alias
+_stores: dict = {}
+_stores_lock = Lock()
+
+
+class LRUMemoryCache(BaseCache):
+    """
+    In-process LRU cache backend
+    - `TIMEOUT` bounds entry age, `OPTIONS["MAX_ENTRIES"]` bounds entry count
+    - the least recently used entry is evicted first, one entry per insert over the limit
+    - async methods run inline, there is no I/O worth a thread hop
+    - keeps hit / miss / eviction counters, see `stats()`
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        with _stores_lock:
+            self._store: LRUStore = _stores.setdefault(name, LRUStore())
+
+    def _live(self, key: str)-> tuple:
+        """
+        entry of a key or None, drops it when expired, call with the lock held
+        """
+        entry = self._store.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._store.entries[key]
+            self._store.expirations += 1
+            return None
+        return entry
+
+    def _set(self, key: str, pickled: bytes, timeout)-> None:
+        """
+        store an entry and evict least recently used ones, call with the lock held
+        """
+        entries: OrderedDict = self._store.entries
+        entries[key] = (pickled, self.get_backend_timeout(timeout))
+        entries.move_to_end(key)
+        while len(entries) > self._max_entries:
+            entries.popitem(last=False)
+            self._store.evictions += 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._store.lock:
+            if self._live(key) is not None:
+                return False
+            self._set(key, pickled, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            entry = self._live(key)
+            if entry is None:
+                self._store.misses += 1
+                return default
+            self._store.entries.move_to_end(key)
+            self._store.hits += 1
+        return pickle.loads(entry[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._store.lock:
+            self._set(key, pickled, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._store.entries[key] = (entry[0], self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            entry = self._live(key)
+            if entry is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(entry[0]) + delta
+            self._store.entries[key] = (pickle.dumps(value, self.pickle_protocol), entry[1])
+            self._store.entries.move_to_end(key)
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._live(key) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._store.entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._store.lock:
+            self._store.entries.clear()
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.add(key, value, timeout=timeout, version=version)
+
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default=default, version=version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.set(key, value, timeout=timeout, version=version)
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.touch(key, timeout=timeout, version=version)
+
+    async def aincr(self, key, delta=1, version=None):
+        return self.incr(key, delta=delta, version=version)
+
+    async def ahas_key(self, key, version=None):
+        return self.has_key(key, version=version)
+
+    async def adelete(self, key, version=None):
+        return self.delete(key, version=version)
+
+    async def aclear(self):
+        return self.clear()
+
+    def stats(self)-> dict:
+        store: LRUStore = self._store
+        lookups: int = store.hits + store.misses
+        return {
+            "hits": store.hits,
+            "misses": store.misses,
+            "hit_ratio": round(store.hits / lookups, 4) if lookups else 0.0,
+            "evictions": store.evictions,
+            "expirations": store.expirations,
+            "size": len(store.entries),
+            "max_size": self._max_entries,
+        }
+
+
+class ResponseCache:
+    """
+    Cache of read endpoint responses
+    - keyed by endpoint, normalized query params and the version of every model the response reads
+    - writes bump the model version, entries of older versions are never read again
+      and age out through LRU eviction / TTL
+    """
+
+    def __init__(self,
+                 alias: str = "responses"):
+        self.alias = alias
+        # response lookups only, the backend counters also include version lookups
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def cache(self)-> BaseCache:
+        return caches[self.alias]
+
+    @staticmethod
+    def version_key(model: Model)-> str:
+        return f"version:{model._meta.label_lower}"
+
+    async def version(self,
+                      model: Model)-> int:
+        """
+        current version of a model
+        """
+        key: str = self.version_key(model)
+        version = await self.cache.aget(key)
+        if version is None:
+            # Start from the clock so an evicted counter never repeats an old version
+            await self.cache.aadd(key, time.time_ns(), timeout=None)
+            version = await self.cache.aget(key, 0)
+        return version
+
+    def bump(self,
+             *models: Model)-> None:
+        """
+        invalidate every cached response that reads one of the models
+        """
+        for model in models:
+            key: str = self.version_key(model)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, time.time_ns(), timeout=None)
+
+    async def abump(self,
+                    *models: Model)-> None:
+        """
+        async version of `bump`
+        """
+        for model in models:
+            key: str = self.version_key(model)
+            try:
+                await self.cache.aincr(key)
+            except ValueError:
+                await self.cache.aset(key, time.time_ns(), timeout=None)
+
+    def invalidate(self, sender: Model, using: str = None, **kwargs)-> None:
+        """
+        `post_save` / `post_delete` receiver, bumps the version once the write transaction commits
+        - a bump inside the transaction would let a concurrent read cache pre-commit rows under the new version
+        """
+        transaction.on_commit(lambda: self.bump(sender), using=using)
+
+    async def key(self,
+                  endpoint: str,
+                  models: tuple,
+                  **params)-> str:
+        """
+        cache key of one endpoint response
+        """
+        versions: str = ".".join([str(await self.version(model)) for model in models])
+        normalized: bytes = json.dumps(params, sort_keys=True, default=str).encode()
+        return f"response:{endpoint}:{versions}:{blake2b(normalized, digest_size=16).hexdigest()}"
+
+    async def aget(self,
+                   key: str)-> dict:
+        """
+        cached `{"response": response dict, "validators": ETag / Last-Modified headers}` or None
+        """
+        cached: dict = await self.cache.aget(key)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    async def aset(self,
+                   key: str,
+                   response,
+                   validators: dict = None)-> None:
+        """
+        cache a `ResponseSchema` with its conditional GET validators, error responses are not cached
+        """
+        if response.status_code == 200 and not response.error:
+            await self.cache.aset(key, {"response": response.dict(), "validators": validators or {}})
+
+    def stats(self)-> dict:
+        lookups: int = self.hits + self.misses
+        backend: dict = self.cache.stats() if hasattr(self.cache, "stats") else {}
+        return {
+            **backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
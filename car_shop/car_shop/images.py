@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from car_shop.logger import logger
+from threading import Lock
+import asyncio
+import os
+
+# Longest edge in pixels of every variant, originals smaller than a variant are not upscaled
+VARIANT_SIZES = {"thumb": 200, "medium": 640, "large": 1280}
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+VARIANT_DIR = "variants"
+
+
+def variant_name(name: str,
+                 size: str,
+                 extension: str)-> str:
+    """
+    storage name of one variant, `car_image/car.jpg` -> `car_image/variants/car.jpg_thumb.webp`
+    - the whole file name is kept, `car.jpg` and `car.png` get different variants
+    """
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, VARIANT_DIR, f"{filename}_{size}.{extension}")
+
+def variant_names(name: str)-> list:
+    """
+    storage names of every variant of an image
+    """
+    return [variant_name(name, size, extension) for size in VARIANT_SIZES for extension in VARIANT_FORMATS]
+
+def rendered_field(name: str)-> str:
+    """
+    boolean model field telling whether the variants of image field `name` are rendered
+    """
+    return f"{name}_rendered"
+
+def variant_urls(name: str,
+                 host: str = "",
+                 rendered: bool = False)-> dict:
+    """
+    variant urls of a stored image, {"thumb": {"webp": url, "jpeg": url}, ...}
+    - every url points to the original image until the variants are rendered, `rendered` comes
+      from the `<field>_rendered` column, storage is never probed
+    """
+    if not name:
+        return None
+    if not rendered:
+        original: str = f"{host}{default_storage.url(name)}"
+        return {size: {extension: original for extension in VARIANT_FORMATS} for size in VARIANT_SIZES}
+    return {size: {extension: f"{host}{default_storage.url(variant_name(name, size, extension))}"
+                   for extension in VARIANT_FORMATS}
+            for size in VARIANT_SIZES}
+
+def render_variants(media_root: str,
+                    name: str,
+                    force: bool = True)-> int:
+    """
+    resize one image to every variant, runs in a worker process
+    - returns number of written files
+    """
+    from PIL import Image, ImageOps
+
+    written: int = 0
+    with Image.open(os.path.join(media_root, name)) as original:
+        original = ImageOps.exif_transpose(original)
+        for size, edge in VARIANT_SIZES.items():
+            resized = original.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for extension, image_format in VARIANT_FORMATS.items():
+                path = os.path.join(media_root, variant_name(name, size, extension))
+                if not force and os.path.exists(path):
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                image = resized
+                if image_format == "JPEG" and image.mode != "RGB":
+                    image = image.convert("RGB")
+                elif image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                image.save(path, format=image_format, quality=82, optimize=True)
+                written += 1
+    return written
+
+def delete_variants(name: str)-> None:
+    """
+    remove every variant of an image
+    """
+    for variant in variant_names(name):
+        if default_storage.exists(variant):
+            default_storage.delete(variant)
+
+
+class ImageVariantPool:
+    """
+    Process pool that renders image variants outside of the web worker
+    """
+
+    def __init__(self,
+                 max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor = None
+        self._lock = Lock()
+
+    @property
+    def executor(self)-> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def reset(self,
+              broken: ProcessPoolExecutor)-> None:
+        """
+        drop a pool whose worker died, the next render starts a new one
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self,
+                     name: str)-> int:
+        """
+        render variants of one storage name, retried once on a new pool if a worker died
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor: ProcessPoolExecutor = self.executor
+            try:
+                return await loop.run_in_executor(executor, render_variants, str(settings.MEDIA_ROOT), name)
+            except BrokenProcessPool:
+                self.reset(executor)
+                if attempt:
+                    raise
+
+    async def build(self,
+                    *names: str)-> list:
+        """
+        render variants of the given storage names concurrently, returns the names rendered
+        - never raises, the image and its row are already stored, failures are logged
+        - callers set the `<field>_rendered` column of the returned names
+        """
+        names = [name for name in names if name]
+        results: list = await asyncio.gather(*[self.render(name) for name in names],
+                                             return_exceptions=True)
+        rendered: list = []
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.error(f"failed to render variants of {name}: {result!r}")
+            else:
+                rendered.append(name)
+        return rendered
+
+
+image_variant_pool = ImageVariantPool(max_workers=settings.IMAGE_VARIANT_WORKERS)
@@ -0,0 +1,117 @@
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+CURSOR_SALT = "car_shop.pagination"
+
+
+class PaginationError(ValueError):
+    """
+    raised for an invalid `cursor` or `order_by` list option
+    """
+    def __init__(self, field: str, message: str):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+class CursorSerializer:
+    """
+    json serializer for cursor payload, supports datetime / decimal values
+    """
+    def dumps(self, obj)-> bytes:
+        return DjangoJSONEncoder(separators=(",", ":")).encode(obj).encode("latin-1")
+
+    def loads(self, data: bytes):
+        return signing.JSONSerializer().loads(data)
+
+
+def encode_cursor(order_by: str,
+                  value,
+                  pk)-> str:
+    """
+    opaque, signed cursor pointing right after the given row
+    """
+    return signing.dumps([order_by, value, pk],
+                         salt=CURSOR_SALT,
+                         serializer=CursorSerializer,
+                         compress=True)
+
+def decode_cursor(cursor: str,
+                  order_by: str)-> tuple:
+    """
+    decode cursor to (value, pk) of the last row of the previous page
+    """
+    try:
+        cursor_order_by, value, pk = signing.loads(cursor,
+                                                   salt=CURSOR_SALT,
+                                                   serializer=CursorSerializer)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise PaginationError("cursor", "invalid cursor")
+    if cursor_order_by != order_by:
+        raise PaginationError("cursor", f"cursor was created for order_by={cursor_order_by}")
+    return value, pk
+
+
+class KeysetPaginator:
+    """
+    Keyset (cursor) pagination
+    - rows are ordered by one whitelisted, non null column with pk as tie breaker
+    - next page is selected with `WHERE (column, pk) > (last column, last pk)` so
+      deep pages cost the same as the first one, unlike OFFSET
+    """
+
+    def __init__(self,
+                 ordering: tuple = ("id",),
+                 default: str = "id"):
+        self.ordering = ordering
+        self.default = default
+
+    def parse_order_by(self,
+                       order_by: str = None)-> tuple:
+        """
+        returns (field, descending) for the requested order_by value
+        """
+        order_by = order_by or self.default
+        field = order_by.lstrip("-")
+        if field not in self.ordering:
+            raise PaginationError("order_by", f"order_by should be one of {', '.join(self.ordering)}")
+        return field, order_by.startswith("-")
+
+    def page(self,
+             queryset: QuerySet,
+             limit: int,
+             cursor: str = None,
+             order_by: str = None)-> QuerySet:
+        """
+        returns queryset for one page, fetching `limit + 1` rows to detect the next page
+        """
+        field, descending = self.parse_order_by(order_by)
+        order_by = f"-{field}" if descending else field
+        if cursor is not None:
+            value, pk = decode_cursor(cursor, order_by)
+            lookup = "lt" if descending else "gt"
+            # `column >= value` is the index condition, the OR only breaks ties on pk
+            queryset = queryset.filter(Q(**{f"{field}__{lookup}e": value}),
+                                       Q(**{f"{field}__{lookup}": value}) | Q(**{f"pk__{lookup}": pk}))
+        pk_order = "-pk" if descending else "pk"
+        return queryset.order_by(order_by, pk_order)[:limit + 1]
+
+    def lookups(self,
+                order_by: str = None)-> list:
+        """
+        `values()` lookups `next_cursor` needs from the last row of a page
+        """
+        field, _ = self.parse_order_by(order_by)
+        return [field, "pk"]
+
+    def next_cursor(self,
+                    last_row: dict,
+                    order_by: str = None)-> str:
+        """
+        cursor for the page following `last_row` (a `values()` row)
+        """
+        field, descending = self.parse_order_by(order_by)
+        return encode_cursor(f"-{field}" if descending else field,
+                             last_row[field],
+                             last_row["pk"])
@@ -0,0 +1,108 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from asgiref.sync import sync_to_async
+
+# backends where `UPDATE ... RETURNING <columns>` is valid SQL
+RETURNING_VENDORS = ("postgresql", "sqlite")
+
+
+def can_update_returning(using: str)-> bool:
+    """
+    check if the database behind the alias supports `UPDATE ... RETURNING`
+    """
+    connection = connections[using]
+    return (connection.vendor in RETURNING_VENDORS
+            and connection.features.can_return_columns_from_insert)
+
+
+def _returning_update(queryset: QuerySet,
+                      values: dict)-> list:
+    """
+    run one `UPDATE ... RETURNING` statement and convert the returned columns
+    """
+    connection = connections[queryset.db]
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    try:
+        sql, params = query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return []
+    if not sql:
+        return []
+
+    meta = queryset.model._meta
+    alias: str = query.get_initial_alias()
+    columns: list = []
+    converters: list = []
+    for field in meta.concrete_fields:
+        col = field.get_col(alias)
+        columns.append(f"{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(field.column)}")
+        converters.append((field.attname,
+                           col,
+                           connection.ops.get_db_converters(col) + col.get_db_converters(connection)))
+    sql = f"{sql} RETURNING {', '.join(columns)}"
+
+    rows: list = []
+    with transaction.mark_for_rollback_on_error(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for record in cursor.fetchall():
+                row: dict = {}
+                for value, (attname, col, field_converters) in zip(record, converters):
+                    for converter in field_converters:
+                        value = converter(value, col, connection)
+                    row[attname] = value
+                rows.append(row)
+    return rows
+
+
+def _fallback_update(queryset: QuerySet,
+                     values: dict)-> list:
+    """
+    lock the matching rows, update them by primary key and read them back in one transaction
+    """
+    meta = queryset.model._meta
+    attnames: list = [field.attname for field in meta.concrete_fields]
+    with transaction.atomic(using=queryset.db):
+        pks: list = list(queryset.select_for_update().values_list("pk", flat=True))
+        if not pks:
+            return []
+        manager = queryset.model._base_manager.using(queryset.db)
+        manager.filter(pk__in=pks).update(**values)
+        return list(manager.filter(pk__in=pks).order_by("pk").values(*attnames))
+
+
+def update_returning(queryset: QuerySet,
+                     values: dict)-> list:
+    """
+    update every row matched by the queryset and return the updated rows
+    - one `UPDATE ... RETURNING` statement on PostgreSQL / SQLite
+    - other backends lock the rows with `SELECT ... FOR UPDATE` and read them back by pk
+    - rows are dicts keyed by column attname (`country_id`, not `country`)
+    - empty `values` runs no query and returns no rows, callers reject an empty payload first
+    """
+    if not values:
+        return []
+    # Queryset update skips `auto_now`, set it like `save()` would
+    now = timezone.now()
+    auto_now: dict = {field.name: now for field in queryset.model._meta.concrete_fields
+                      if getattr(field, "auto_now", False)}
+    values = {**auto_now, **values}
+    queryset = queryset.all()
+    queryset._for_write = True
+    if can_update_returning(queryset.db):
+        return _returning_update(queryset=queryset, values=values)
+    return _fallback_update(queryset=queryset, values=values)
+
+
+async def aupdate_returning(queryset: QuerySet,
+                            values: dict)-> list:
+    """
+    async version of `update_returning`
+    """
+    return await sync_to_async(update_returning)(queryset=queryset, values=values)
@@ -0,0 +1,151 @@
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from ninja import NinjaAPI
+from ninja.renderers import BaseRenderer, JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer on orjson
+    - datetimes, dates and UUIDs are encoded natively, everything else falls back to `NinjaJSONEncoder`
+    - non string dict keys are converted like `json.dumps` does
+    """
+    media_type = "application/json"
+    options: int = 0 if orjson is None else orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def __init__(self):
+        self.encoder = NinjaJSONEncoder()
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        return orjson.dumps(data, default=self.encoder.default, option=self.options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack renderer
+    - values msgpack has no type for are encoded like JSON (datetime as ISO 8601 string, Decimal as string)
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+    charset = None
+
+    def __init__(self):
+        self.encoder = NinjaJSONEncoder()
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        return msgpack.packb(data, default=self.encoder.default, use_bin_type=True)
+
+
+def representation_etag(etag: str,
+                        media_type: str = None)-> str:
+    """
+    ETag of one representation, JSON keeps the plain ETag, other media types get a suffix
+    - strong ETags must differ between a JSON and a MessagePack body of the same data
+    """
+    if not media_type or media_type == "application/json" or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{media_type.rsplit("/", 1)[-1]}"'
+
+
+def default_renderers()-> list:
+    """
+    renderers of the installed encoders, the first one is used when the client has no preference
+    """
+    renderers: list = [ORJSONRenderer() if orjson is not None else JSONRenderer()]
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer())
+    return renderers
+
+
+def accepted_media_types(request: HttpRequest)-> list:
+    """
+    media types of the request `Accept` header, highest quality first
+    """
+    accepted: list = []
+    for (position, item) in enumerate(request.headers.get("Accept", "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        if not media_type:
+            continue
+        quality: float = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append((-quality, position, media_type.lower()))
+    return [media_type for (_, _, media_type) in sorted(accepted)]
+
+
+class NegotiatingNinjaAPI(NinjaAPI):
+    """
+    NinjaAPI that picks the response renderer from the request `Accept` header
+    - falls back to the first renderer when nothing in `Accept` matches
+    - the chosen media type is kept on `request.response_media_type` for the view
+    - responses carry `Vary: Accept` and a per representation `ETag`
+    """
+
+    def __init__(self, *args, renderers: list = None, **kwargs):
+        self.renderers: list = renderers or default_renderers()
+        super().__init__(*args, renderer=self.renderers[0], **kwargs)
+
+    def select_renderer(self, request: HttpRequest)-> BaseRenderer:
+        by_media_type: dict = {renderer.media_type: renderer for renderer in self.renderers}
+        for media_type in accepted_media_types(request):
+            if media_type in by_media_type:
+                return by_media_type[media_type]
+            if media_type in ("*/*", "application/*"):
+                return self.renderer
+        return self.renderer
+
+    @staticmethod
+    def content_type(renderer: BaseRenderer)-> str:
+        if renderer.charset:
+            return f"{renderer.media_type}; charset={renderer.charset}"
+        return renderer.media_type
+
+    def create_response(
+        self,
+        request: HttpRequest,
+        data: Any,
+        *,
+        status: int = None,
+        temporal_response: HttpResponse = None,
+    ) -> HttpResponse:
+        if temporal_response:
+            status = temporal_response.status_code
+        assert status
+
+        renderer: BaseRenderer = self.select_renderer(request)
+        content = renderer.render(request, data, response_status=status)
+
+        if temporal_response:
+            response = temporal_response
+            response.content = content
+            response["Content-Type"] = self.content_type(renderer)
+        else:
+            response = HttpResponse(content, status=status, content_type=self.content_type(renderer))
+        if response.has_header("ETag"):
+            response["ETag"] = representation_etag(response["ETag"], renderer.media_type)
+        patch_vary_headers(response, ("Accept",))
+        return response
+
+    def create_temporal_response(self, request: HttpRequest) -> HttpResponse:
+        request.response_media_type = self.select_renderer(request).media_type
+        return super().create_temporal_response(request)
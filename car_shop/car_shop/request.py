@@ -1,4 +1,5 @@
 from ninja import Schema
+from pydantic import Field
 from enum import Enum
 
 class BaseQueryFilter(Schema):
@@ -9,6 +10,29 @@ class BaseQueryFilter(Schema):
         result: dict = {key: value for (key, value) in self.dict().items() if value is not None}
         return {key: value.name if isinstance(value, Enum) else value for key, value in result.items()}        
 
+class ResponseFormat(Enum):
+    """
+    `List response layouts`
+    """
+    rows: str = "rows"
+    columnar: str = "columnar"
+
+class ListOptionsSchema(Schema):
+    """
+    List endpoint options
+    - limit: **max rows per page**
+    - cursor: **`next_cursor` value returned with the previous page**
+    - order_by: **column to order by, prefix with `-` for descending order**
+    - format: **`rows` (default) or `columnar`, one array per field in `columns` and
+      every related object once in `related`**
+    - fields: **comma separated fields to return, e.g. `id,name,price`, defaults to all fields**
+    """
+    limit: int = Field(100, ge=1, le=1000)
+    cursor: str = None
+    order_by: str = None
+    format: ResponseFormat = ResponseFormat.rows
+    fields: str = None
+
     
 class Color(Enum):
     """ 
@@ -1,14 +1,90 @@
-from django.db.models.fields.files import ImageField
-from django.db.models import Model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Model, QuerySet
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
 
+from hashlib import blake2b
 from ninja.schema import Schema
 from typing import List, AsyncIterable
 
+import json
+
+from car_shop.pagination import KeysetPaginator, PaginationError
+from car_shop.query import aupdate_returning
+from car_shop.renderers import representation_etag
+from car_shop.request import ListOptionsSchema, ResponseFormat
+from car_shop.serializers import FieldSelectionError, get_serializer
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def accepts(request,
+            media_type: str)-> bool:
+    """
+    check if the request `Accept` header lists the given media type
+    """
+    accept: str = request.headers.get("Accept", "")
+    return media_type in [item.split(";")[0].strip() for item in accept.split(",")]
+
+def if_none_match(request,
+                  etag: str)-> bool:
+    """
+    check if the request `If-None-Match` header matches the given ETag of the negotiated representation
+    """
+    etag = representation_etag(etag, getattr(request, "response_media_type", None))
+    header: str = request.headers.get("If-None-Match", "")
+    # weak comparison, `W/"abc"` matches `"abc"`
+    tags: list = [item.strip()[2:] if item.strip().startswith("W/") else item.strip() for item in header.split(",")]
+    return "*" in tags or (etag[2:] if etag.startswith("W/") else etag) in tags
+
+async def avalidators(queryset: QuerySet,
+                      timestamps: tuple = ("updated_at",),
+                      **params)-> dict:
+    """
+    `ETag` / `Last-Modified` of a filtered queryset from one aggregate query, no rows are read
+    - the ETag hashes the request params with `Count(pk)` and `Max()` of every timestamp lookup,
+      an insert, update or delete of a matching row changes it
+    - `Last-Modified` is informational, a delete does not move it forward
+    """
+    aggregates: dict = {f"max_{index}": Max(timestamp) for (index, timestamp) in enumerate(timestamps)}
+    result: dict = await queryset.order_by().aaggregate(count=Count("pk"), **aggregates)
+    normalized: bytes = json.dumps({"params": params, "result": result}, sort_keys=True, default=str).encode()
+    validators: dict = {"ETag": f'"{blake2b(normalized, digest_size=16).hexdigest()}"'}
+    modified: list = [value for (key, value) in result.items() if key != "count" and value is not None]
+    if modified:
+        validators["Last-Modified"] = http_date(max(modified).timestamp())
+    return validators
+
+def set_validators(http_response: HttpResponse,
+                   validators: dict)-> HttpResponse:
+    """
+    copy `ETag` / `Last-Modified` to the response headers
+    """
+    for (header, value) in validators.items():
+        http_response[header] = value
+    return http_response
+
+def not_modified(request,
+                 validators: dict)-> HttpResponseNotModified:
+    """
+    empty `304 Not Modified` carrying the validators of the negotiated representation
+    """
+    media_type: str = getattr(request, "response_media_type", None)
+    response = set_validators(HttpResponseNotModified(), validators)
+    if "ETag" in validators:
+        response["ETag"] = representation_etag(validators["ETag"], media_type)
+    patch_vary_headers(response, ("Accept",))
+    return response
+
 class ResponseSchema(Schema):
     status_code: int = 200
     error: dict = {}
     description: str = None
     data: List[dict] = []
+    next_cursor: str = None
+    # `format=columnar` lists: one array per field and every related object once, keyed by pk
+    columns: dict = None
+    related: dict = None
 
     def is_iterable(self, obj):
         if isinstance(obj, AsyncIterable):
@@ -22,16 +98,7 @@ class ResponseSchema(Schema):
         """
         get table instance and generate pull path for image field
         """
-        dict_data = schema_model.from_orm(obj).dict()
-        model_fields = obj.__class__._meta.get_fields()
-        for field in model_fields:
-            # Check if the field is of type ImageField
-            if isinstance(field, ImageField):
-                # Access the field name and value
-                field_name = field.name
-                if getattr(obj, field_name) is not None:
-                    dict_data[field_name] = f"http://localhost:8000{getattr(obj, field_name).url}"
-        return dict_data
+        return get_serializer(schema_model, obj.__class__).from_instance(obj)
 
     async def dict_data(self,
                         schema_model: Schema, 
@@ -40,13 +107,107 @@ class ResponseSchema(Schema):
         convert orm model/ query object to dict
         """
 
-        if self.is_iterable(data):
+        if isinstance(data, QuerySet):
+            serializer = get_serializer(schema_model, data.model)
+            return [serializer.to_dict(row) async for row in data.values(*serializer.lookups)]
+        elif self.is_iterable(data):
             return [self.get_full_image_path(schema_model=schema_model, obj=item) async for item in data]
         else:
             result = []
             temp = await data
             if temp is not None:
-                result.append(schema_model.from_orm(temp).dict())
+                result.append(self.get_full_image_path(schema_model=schema_model, obj=temp))
                 return result
             else:
-                return result
\ No newline at end of file
+                return result
+
+    async def updated_data(self,
+                           schema_model: Schema,
+                           data: QuerySet,
+                           values: dict)-> list:
+        """
+        update the rows matched by the queryset and convert the updated rows to dict
+        - the rows come back from the UPDATE itself, the filter is not run a second time
+        - an empty payload is a `400`, matched rows are not reported as updated
+        """
+        if not values:
+            self.status_code = 400
+            self.error.update({"payload": "nothing to update, payload has no fields"})
+            return []
+        rows: list = await aupdate_returning(queryset=data, values=values)
+        return await get_serializer(schema_model, data.model).from_columns(rows)
+
+    def page_queryset(self,
+                      schema_model: Schema,
+                      data: QuerySet,
+                      list_options: ListOptionsSchema,
+                      paginator: KeysetPaginator = KeysetPaginator(),
+                      lookups: list = None)-> QuerySet:
+        """
+        `values()` queryset for one keyset page
+        - `lookups` defaults to every lookup of the serializer projected to `list_options.fields`
+        - raises `PaginationError` / `FieldSelectionError` on invalid list options
+        """
+        serializer = get_serializer(schema_model, data.model).project(list_options.fields)
+        lookups = (lookups or serializer.lookups) + paginator.lookups(order_by=list_options.order_by)
+        return paginator.page(queryset=data.values(*dict.fromkeys(lookups)),
+                              limit=list_options.limit,
+                              cursor=list_options.cursor,
+                              order_by=list_options.order_by)
+
+    async def paginated_data(self,
+                             schema_model: Schema,
+                             data: QuerySet,
+                             list_options: ListOptionsSchema,
+                             paginator: KeysetPaginator = KeysetPaginator())-> list:
+        """
+        convert one keyset page of the queryset to dict and set `next_cursor`
+        - `format=columnar` fills `columns` / `related` instead and returns no rows, relations are
+          read with one `pk__in` query each instead of a join per row
+        """
+        columnar: bool = list_options.format is ResponseFormat.columnar
+        try:
+            serializer = get_serializer(schema_model, data.model).project(list_options.fields)
+            page = self.page_queryset(schema_model=schema_model,
+                                      data=data,
+                                      list_options=list_options,
+                                      paginator=paginator,
+                                      lookups=serializer.column_lookups if columnar else None)
+        except (PaginationError, FieldSelectionError) as e:
+            self.status_code = 400
+            self.error.update({e.field: e.message})
+            return []
+        rows: list = [row async for row in page]
+        if len(rows) > list_options.limit:
+            rows = rows[:list_options.limit]
+            self.next_cursor = paginator.next_cursor(last_row=rows[-1],
+                                                     order_by=list_options.order_by)
+        if columnar:
+            self.columns, self.related = await serializer.to_columns(rows)
+            return []
+        return [serializer.to_dict(row) for row in rows]
+
+    def stream_ndjson(self,
+                      schema_model: Schema,
+                      data: QuerySet,
+                      chunk_size: int = 2000,
+                      fields: str = None):
+        """
+        stream queryset rows as newline delimited json
+        - rows are fetched `chunk_size` at a time from a server-side cursor,
+          so memory stays flat regardless of the row count
+        - `fields` limits the columns read and returned, invalid names get the 400 response instead
+        """
+        encoder = DjangoJSONEncoder()
+        try:
+            serializer = get_serializer(schema_model, data.model).project(fields)
+        except FieldSelectionError as e:
+            self.status_code = 400
+            self.error.update({e.field: e.message})
+            return self
+
+        async def rows():
+            async for row in data.values(*serializer.lookups).aiterator(chunk_size=chunk_size):
+                yield encoder.encode(serializer.to_dict(row)) + "\n"
+
+        return StreamingHttpResponse(rows(), content_type=NDJSON_MEDIA_TYPE)
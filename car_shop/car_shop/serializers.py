@@ -0,0 +1,285 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.fields.files import ImageField
+from django.db.models import Model
+
+from ninja.schema import Schema
+from functools import lru_cache
+import copy
+
+from car_shop.images import rendered_field, variant_urls
+
+IMAGE_HOST = "http://localhost:8000"
+# Distinct `fields=` projections kept per serializer
+MAX_PROJECTIONS = 256
+
+
+class FieldSelectionError(ValueError):
+    """
+    `fields=` names a field the schema does not have
+    """
+
+    def __init__(self, field: str, message: str):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+class ModelSerializer:
+    """
+    Precompiled (schema, model) serializer
+    - works out once which columns to read and which of them are images
+    - builds plain dicts straight from `values()` rows, no schema validation per row
+    - every image field `<name>` also gets `<name>_variants` with thumb / medium / large urls,
+      read from the model's `<name>_rendered` column when it has one
+    """
+
+    def __init__(self,
+                 schema_model: Schema,
+                 model: Model,
+                 prefix: str = ""):
+        self.schema_model = schema_model
+        self.model = model
+        self.prefix = prefix
+        # (output name, values lookup, model field, is image)
+        self.fields: list = []
+        # (output name, values lookup of the FK id, nested serializer)
+        self.relations: list = []
+        # (output name, default) for schema fields without a model column
+        self.defaults: list = []
+        # image output name -> (values lookup, attname) of its `<name>_rendered` column
+        self.rendered: dict = {}
+
+        for name, schema_field in schema_model.__fields__.items():
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                self.defaults.append((name, schema_field.default))
+                continue
+            if not model_field.concrete:
+                self.defaults.append((name, schema_field.default))
+                continue
+            nested = schema_field.type_
+            if model_field.is_relation and isinstance(nested, type) and issubclass(nested, Schema):
+                self.relations.append((name,
+                                       f"{prefix}{name}",
+                                       ModelSerializer(schema_model=nested,
+                                                       model=model_field.related_model,
+                                                       prefix=f"{prefix}{name}__")))
+            else:
+                is_image: bool = isinstance(model_field, ImageField)
+                self.fields.append((name, f"{prefix}{name}", model_field, is_image))
+                if is_image:
+                    try:
+                        flag = model._meta.get_field(rendered_field(name))
+                        self.rendered[name] = (f"{prefix}{flag.name}", flag.attname)
+                    except FieldDoesNotExist:
+                        pass
+
+        # Output names `fields=` is validated against
+        self.field_names: frozenset = frozenset(
+            [name for (name, _, _, _) in self.fields] +
+            [f"{name}_variants" for (name, _, _, is_image) in self.fields if is_image] +
+            [name for (name, _, _) in self.relations] +
+            [name for (name, _) in self.defaults]
+        )
+        self._projections: dict = {}
+
+    @property
+    def lookups(self)-> list:
+        """
+        `values()` lookups needed to serialize one row, nested relations included
+        """
+        lookups: list = self.field_lookups
+        for (_, fk_lookup, nested) in self.relations:
+            lookups.append(fk_lookup)
+            lookups.extend(nested.lookups)
+        return list(dict.fromkeys(lookups))
+
+    @property
+    def field_lookups(self)-> list:
+        """
+        `values()` lookups of the own columns, image fields bring their `<name>_rendered` column
+        """
+        lookups: list = []
+        for (name, lookup, _, is_image) in self.fields:
+            lookups.append(lookup)
+            if is_image and name in self.rendered:
+                lookups.append(self.rendered[name][0])
+        return lookups
+
+    @property
+    def column_lookups(self)-> list:
+        """
+        `values()` lookups needed by `to_columns`, relations are read as their FK id only, no joins
+        """
+        lookups: list = self.field_lookups
+        lookups.extend(fk_lookup for (_, fk_lookup, _) in self.relations)
+        return list(dict.fromkeys(lookups))
+
+    def project(self,
+                fields: str = None)-> "ModelSerializer":
+        """
+        serializer limited to the comma separated output `fields`, e.g. `id,name,price`
+        - lookups of fields nobody asked for are dropped, `values()` reads fewer columns and
+          nested relations are joined only when requested
+        - an image field and its `<name>_variants` are selected together
+        - raises `FieldSelectionError` for names the schema does not have
+        """
+        names: frozenset = frozenset(name.strip() for name in (fields or "").split(",") if name.strip())
+        if not names:
+            return self
+        projection = self._projections.get(names)
+        if projection is not None:
+            return projection
+        unknown: frozenset = names - self.field_names
+        if unknown:
+            raise FieldSelectionError("fields", f"unknown fields {', '.join(sorted(unknown))}, "
+                                                f"fields should be any of {', '.join(sorted(self.field_names))}")
+        projection = copy.copy(self)
+        projection.fields = [item for item in self.fields
+                             if item[0] in names or (item[3] and f"{item[0]}_variants" in names)]
+        projection.relations = [item for item in self.relations if item[0] in names]
+        projection.defaults = [item for item in self.defaults if item[0] in names]
+        projection._projections = {}
+        if len(self._projections) >= MAX_PROJECTIONS:
+            self._projections.clear()
+        self._projections[names] = projection
+        return projection
+
+    @staticmethod
+    def image_url(model_field: ImageField,
+                  name: str)-> str:
+        """
+        full url for a stored image name
+        """
+        if not name:
+            return None
+        return f"{IMAGE_HOST}{model_field.storage.url(name)}"
+
+    def is_rendered(self,
+                    name: str,
+                    row: dict,
+                    key: int = 0)-> bool:
+        """
+        `<name>_rendered` value of a row, `key` 0 reads it by values lookup, 1 by attname
+        """
+        flag = self.rendered.get(name)
+        return bool(flag and row[flag[key]])
+
+    def to_dict(self,
+                row: dict)-> dict:
+        """
+        serialize one `values()` row
+        """
+        result: dict = {name: default for (name, default) in self.defaults}
+        for (name, lookup, model_field, is_image) in self.fields:
+            if is_image:
+                result[name] = self.image_url(model_field, row[lookup])
+                result[f"{name}_variants"] = variant_urls(row[lookup], host=IMAGE_HOST,
+                                                          rendered=self.is_rendered(name, row))
+            else:
+                result[name] = row[lookup]
+        for (name, fk_lookup, nested) in self.relations:
+            result[name] = None if row[fk_lookup] is None else nested.to_dict(row)
+        return result
+
+    def from_instance(self,
+                      obj: Model)-> dict:
+        """
+        serialize one model instance, nested relations should be loaded with `select_related`
+        """
+        result: dict = {name: default for (name, default) in self.defaults}
+        for (name, _, model_field, is_image) in self.fields:
+            if is_image:
+                result[name] = self.image_url(model_field, getattr(obj, name).name)
+                result[f"{name}_variants"] = variant_urls(getattr(obj, name).name, host=IMAGE_HOST,
+                                                          rendered=name in self.rendered and
+                                                                   bool(getattr(obj, self.rendered[name][1])))
+            else:
+                result[name] = getattr(obj, model_field.attname)
+        for (name, _, nested) in self.relations:
+            related = getattr(obj, name)
+            result[name] = None if related is None else nested.from_instance(related)
+        return result
+
+    async def related_tables(self,
+                             pks: dict)-> dict:
+        """
+        `{relation name: {pk: serialized related object}}` for `{relation name: pks}`
+        - one `pk__in` query per relation, every distinct object is serialized once
+        """
+        related: dict = {}
+        for (name, _, nested) in self.relations:
+            ids: set = {pk for pk in pks.get(name, ()) if pk is not None}
+            serializer = get_serializer(nested.schema_model, nested.model)
+            related[name] = {
+                row["pk"]: serializer.to_dict(row)
+                async for row in nested.model._base_manager.filter(pk__in=ids).values("pk", *serializer.lookups)
+            } if ids else {}
+        return related
+
+    def columns(self,
+                rows: list)-> dict:
+        """
+        serialize `values()` rows of `column_lookups` column by column, one array per output field
+        - relation columns hold the related pk
+        """
+        columns: dict = {name: [default] * len(rows) for (name, default) in self.defaults}
+        for (name, lookup, model_field, is_image) in self.fields:
+            values: list = [row[lookup] for row in rows]
+            if is_image:
+                columns[name] = [self.image_url(model_field, value) for value in values]
+                columns[f"{name}_variants"] = [variant_urls(value, host=IMAGE_HOST, rendered=self.is_rendered(name, row))
+                                               for (value, row) in zip(values, rows)]
+            else:
+                columns[name] = values
+        for (name, fk_lookup, _) in self.relations:
+            columns[name] = [row[fk_lookup] for row in rows]
+        return columns
+
+    async def to_columns(self,
+                         rows: list)-> tuple:
+        """
+        returns `(columns, related)` for `values()` rows of `column_lookups`
+        - the related objects of relation columns are in `related[name][pk]`
+        """
+        columns: dict = self.columns(rows)
+        related: dict = await self.related_tables({name: columns[name] for (name, _, _) in self.relations})
+        return columns, related
+
+    async def from_columns(self,
+                           rows: list)-> list:
+        """
+        serialize rows keyed by column attname, e.g. rows returned by `update_returning`
+        - each nested relation is read with one `pk__in` query for all rows
+        """
+        related: dict = await self.related_tables({
+            name: [row[self.model._meta.get_field(name).attname] for row in rows]
+            for (name, _, _) in self.relations
+        })
+
+        result: list = []
+        for row in rows:
+            item: dict = {name: default for (name, default) in self.defaults}
+            for (name, _, model_field, is_image) in self.fields:
+                value = row[model_field.attname]
+                if is_image:
+                    item[name] = self.image_url(model_field, value)
+                    item[f"{name}_variants"] = variant_urls(value, host=IMAGE_HOST,
+                                                            rendered=self.is_rendered(name, row, 1))
+                else:
+                    item[name] = value
+            for (name, _, _) in self.relations:
+                attname: str = self.model._meta.get_field(name).attname
+                item[name] = related[name].get(row[attname])
+            result.append(item)
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_serializer(schema_model: Schema,
+                   model: Model)-> ModelSerializer:
+    """
+    serializer registry, one compiled serializer per (schema, model) pair
+    """
+    return ModelSerializer(schema_model=schema_model, model=model)
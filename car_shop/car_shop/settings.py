@@ -98,6 +98,10 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
+# Password hashing executor, worker threads and max waiting hashes before 503
+PASSWORD_HASHING_WORKERS = 4
+PASSWORD_HASHING_QUEUE_LIMIT = 64
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -177,6 +181,22 @@ os.environ["JWT_EXPIRES"] = "Expires time of access token"
 # 
 os.environ["JWT_SECRET_KEY"] = get_random_secret_key()
 os.environ["REFRESH_EXPIRE"] = "Expires time of refresh token"
+# Max verified tokens kept by AuthBearer, each entry is dropped at the token expiry
+JWT_TOKEN_CACHE_SIZE = 10000
+
+# `responses` caches catalog GET responses, see `car_shop.cache.ResponseCache`
+# Entries are in-process, TIMEOUT bounds how long another worker can serve a response
+# its own writes did not invalidate
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "car_shop.cache.LRUMemoryCache",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
 
 
 GOOGLE_CLIENT_ID = "Google Client Id"
@@ -185,8 +205,24 @@ SOCIAL_SECRET = "Google Secret key"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Stream every upload to a temporary file on disk instead of buffering it in memory
+FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+MAX_IMAGE_UPLOAD_SIZE = 15 * 1024 * 1024
+# Decompression bomb guard, checked from the image header before decoding
+MAX_IMAGE_PIXELS = 50_000_000
+# Resumable chunked uploads, kept outside MEDIA_ROOT so partial files are never served
+UPLOAD_SESSION_DIR = os.path.join(BASE_DIR, 'upload_sessions')
+UPLOAD_CHUNK_MAX_SIZE = 2 * 1024 * 1024
+# Sessions without a chunk for this many seconds are deleted
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
 EMAIL_USE_TLS = True  
 EMAIL_HOST = "smtp.gmail.com"  
 EMAIL_HOST_USER = "user host email"
 EMAIL_HOST_PASSWORD = "user email pass key"  
-EMAIL_PORT = 587
\ No newline at end of file
+EMAIL_PORT = 587
+# Background mail dispatcher, max messages per batch and seconds to keep an idle SMTP connection open
+EMAIL_DISPATCH_BATCH_SIZE = 50
+EMAIL_DISPATCH_IDLE_TIMEOUT = 30
+# Worker processes rendering thumb / medium / large image variants
+IMAGE_VARIANT_WORKERS = 2
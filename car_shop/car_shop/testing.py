@@ -0,0 +1,35 @@
+from django.db import connection
+from django.db.models import QuerySet
+
+
+class QueryPlanTestMixin:
+    """
+    Assertions on PostgreSQL query plans
+    """
+
+    @classmethod
+    def analyze(cls, *tables: str)-> None:
+        """
+        refresh planner statistics after seeding test data
+        """
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    def assertNoSeqScan(self,
+                        queryset: QuerySet,
+                        table: str)-> None:
+        """
+        fail if the plan of the queryset reads the given table with a sequential scan
+        """
+        plan: str = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table}", plan, msg=f"\n{queryset.query}\n{plan}")
+
+    def assertUsesIndex(self,
+                        queryset: QuerySet,
+                        index: str)-> None:
+        """
+        fail unless the plan of the queryset reads the given index
+        """
+        plan: str = queryset.explain()
+        self.assertIn(f" using {index} ", f"{plan.lower()} ", msg=f"\n{queryset.query}\n{plan}")
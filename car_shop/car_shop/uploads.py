@@ -0,0 +1,234 @@
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Model
+
+from asgiref.sync import sync_to_async
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+import warnings
+
+# Magic bytes of accepted image formats
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+}
+FORMAT_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+class ImageValidationError(ValueError):
+    """
+    raised when an upload is not an acceptable image
+    """
+
+
+def sniff_content_type(header: bytes)-> str:
+    """
+    content type from the file magic bytes, None for unsupported files
+    """
+    for signature, content_type in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return content_type
+    return None
+
+def validate_image(file)-> str:
+    """
+    validate an uploaded image by magic bytes and image header, ignores the client content type
+    - checks file size and pixel count before any pixel data is decoded (decompression bomb guard)
+    - returns the sniffed content type
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    if file.size is not None and file.size > settings.MAX_IMAGE_UPLOAD_SIZE:
+        raise ImageValidationError(f"file is larger than {settings.MAX_IMAGE_UPLOAD_SIZE} bytes")
+    file.seek(0)
+    content_type = sniff_content_type(file.read(16))
+    if content_type is None:
+        raise ImageValidationError("file is not a jpeg or png image")
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(file) as image:
+                width, height = image.size
+                if width * height > settings.MAX_IMAGE_PIXELS:
+                    raise ImageValidationError(f"image has more than {settings.MAX_IMAGE_PIXELS} pixels")
+                if FORMAT_CONTENT_TYPES.get(image.format) != content_type:
+                    raise ImageValidationError("image header does not match file type")
+                image.verify()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ImageValidationError(f"image has more than {settings.MAX_IMAGE_PIXELS} pixels")
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ImageValidationError("image is corrupted")
+    finally:
+        file.seek(0)
+    return content_type
+
+async def avalidate_images(*files)-> None:
+    """
+    validate images concurrently off the event loop, raises the first `ImageValidationError`
+    """
+    await asyncio.gather(*[sync_to_async(validate_image, thread_sensitive=False)(file) for file in files])
+
+async def asave_images(instance: Model,
+                       files: dict)-> None:
+    """
+    write {image field name: file} to storage concurrently and assign stored names to the instance
+    - saving the instance afterwards does not copy the files again
+    """
+    async def save(field_name: str, file)-> None:
+        field = instance._meta.get_field(field_name)
+        name = field.generate_filename(instance, os.path.basename(file.name))
+        stored_name = await sync_to_async(field.storage.save, thread_sensitive=False)(name, file, max_length=field.max_length)
+        setattr(instance, field_name, stored_name)
+
+    await asyncio.gather(*[save(field_name, file) for field_name, file in files.items()])
+
+
+class ChunkedUploadError(ValueError):
+    """
+    raised for unknown or expired upload sessions, offset mismatch or oversized uploads
+    """
+
+
+class ChunkedUpload:
+    """
+    Resumable upload session stored under `UPLOAD_SESSION_DIR`
+    - `<id>.json` keeps owner, file name and expected size, `<id>.part` the received bytes
+    - chunks are appended at the current offset, a client resumes from `offset` after a failure
+    - a session belongs to the user who created it, other users get "unknown upload id"
+    - sessions idle for `UPLOAD_SESSION_TTL` seconds expire, see `delete_expired`
+    """
+
+    def __init__(self,
+                 upload_id: str,
+                 owner: str):
+        try:
+            self.upload_id = uuid.UUID(upload_id).hex
+        except (ValueError, TypeError, AttributeError):
+            raise ChunkedUploadError("unknown upload id")
+        self.meta_path = os.path.join(settings.UPLOAD_SESSION_DIR, f"{self.upload_id}.json")
+        self.part_path = os.path.join(settings.UPLOAD_SESSION_DIR, f"{self.upload_id}.part")
+        try:
+            with open(self.meta_path) as meta_file:
+                meta: dict = json.load(meta_file)
+        except (OSError, ValueError):
+            raise ChunkedUploadError("unknown upload id")
+        if meta.get("owner") != owner:
+            raise ChunkedUploadError("unknown upload id")
+        if self.expired():
+            self.delete()
+            raise ChunkedUploadError("upload expired, please start a new upload")
+        self.owner: str = owner
+        self.filename: str = meta["filename"]
+        self.size: int = meta["size"]
+
+    @classmethod
+    def create(cls,
+               filename: str,
+               size: int,
+               owner: str)-> "ChunkedUpload":
+        if size > settings.MAX_IMAGE_UPLOAD_SIZE:
+            raise ChunkedUploadError(f"file is larger than {settings.MAX_IMAGE_UPLOAD_SIZE} bytes")
+        os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+        cls.delete_expired()
+        upload_id = uuid.uuid4().hex
+        # Part file first, a meta file always has its part file
+        open(os.path.join(settings.UPLOAD_SESSION_DIR, f"{upload_id}.part"), "wb").close()
+        with open(os.path.join(settings.UPLOAD_SESSION_DIR, f"{upload_id}.json"), "w") as meta_file:
+            json.dump({"owner": owner, "filename": os.path.basename(filename), "size": size}, meta_file)
+        return cls(upload_id, owner=owner)
+
+    @staticmethod
+    def is_expired(path: str,
+                   now: float = None)-> bool:
+        """
+        check if a session file was last written more than `UPLOAD_SESSION_TTL` seconds ago
+        """
+        try:
+            modified: float = os.path.getmtime(path)
+        except OSError:
+            return True
+        return modified + settings.UPLOAD_SESSION_TTL < (now if now is not None else time.time())
+
+    def expired(self)-> bool:
+        # Every appended chunk touches the part file, so it holds the last activity
+        return self.is_expired(self.part_path)
+
+    @classmethod
+    def delete_expired(cls)-> int:
+        """
+        delete abandoned sessions (and stray part files), returns the number of deleted files
+        """
+        if not os.path.isdir(settings.UPLOAD_SESSION_DIR):
+            return 0
+        now: float = time.time()
+        deleted: int = 0
+        for filename in os.listdir(settings.UPLOAD_SESSION_DIR):
+            upload_id, extension = os.path.splitext(filename)
+            if extension not in (".json", ".part"):
+                continue
+            part_path = os.path.join(settings.UPLOAD_SESSION_DIR, f"{upload_id}.part")
+            if cls.is_expired(part_path, now) and cls.is_expired(os.path.join(settings.UPLOAD_SESSION_DIR, filename), now):
+                try:
+                    os.remove(os.path.join(settings.UPLOAD_SESSION_DIR, filename))
+                    deleted += 1
+                except OSError:
+                    pass
+        return deleted
+
+    @property
+    def offset(self)-> int:
+        return os.path.getsize(self.part_path)
+
+    def append(self,
+               offset: int,
+               chunk: bytes)-> int:
+        """
+        append a chunk at `offset`, returns the new offset
+        - the offset is checked and the chunk written under an exclusive `flock` of the part file,
+          two workers sending the same offset can not both write
+        """
+        if offset + len(chunk) > self.size:
+            raise ChunkedUploadError(f"upload is larger than the declared size {self.size}")
+        if offset == 0 and sniff_content_type(chunk[:16]) is None:
+            raise ChunkedUploadError("file is not a jpeg or png image")
+        try:
+            part_file = open(self.part_path, "ab")
+        except FileNotFoundError:
+            raise ChunkedUploadError("unknown upload id")
+        with part_file:
+            fcntl.flock(part_file.fileno(), fcntl.LOCK_EX)
+            try:
+                current: int = os.fstat(part_file.fileno()).st_size
+                if offset != current:
+                    raise ChunkedUploadError(f"offset should be {current}")
+                part_file.write(chunk)
+                part_file.flush()
+                return os.fstat(part_file.fileno()).st_size
+            finally:
+                fcntl.flock(part_file.fileno(), fcntl.LOCK_UN)
+
+    def open(self)-> File:
+        """
+        completed upload as a validated django `File`
+        """
+        if self.offset != self.size:
+            raise ChunkedUploadError(f"upload is incomplete, received {self.offset} of {self.size} bytes")
+        file = File(open(self.part_path, "rb"), name=self.filename)
+        try:
+            validate_image(file)
+        except ImageValidationError:
+            file.close()
+            raise
+        return file
+
+    def delete(self)-> None:
+        for path in (self.meta_path, self.part_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
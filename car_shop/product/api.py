@@ -1,78 +1,174 @@
 from ninja import Router, Query, Body, Form, File
 from ninja.files import UploadedFile
-from django.db.models import Q
+from django.conf import settings
+from django.http import HttpResponse
+from django.db.models import Q, Value, FloatField
 
+from asgiref.sync import sync_to_async
 from typing import List
+import io
 
-from product.request import CarPostSchema, CarSchema, CarQueryFilterSchema, CarSearchFilterScheam, CarUpdateSchema
-from car_shop.response import ResponseSchema
+from product.request import CarPostSchema, CarSchema, CarQueryFilterSchema, CarRangeFilterSchema, CarSearchFilterScheam, \
+    CarUpdateSchema, ChunkedUploadSchema, ImageSlot, ImportFormat
+from car_shop.response import ResponseSchema, accepts, if_none_match, avalidators, set_validators, not_modified, \
+    NDJSON_MEDIA_TYPE
+from car_shop.request import ListOptionsSchema
+from car_shop.pagination import KeysetPaginator
+from car_shop.cache import response_cache
+from car_shop.serializers import get_serializer
+from car_shop.images import image_variant_pool, rendered_field
+from car_shop.uploads import ImageValidationError, ChunkedUploadError, ChunkedUpload, avalidate_images, asave_images
 from product.models import Car
-from shop.models import Country
+from product.search import search_cars, car_index
+from product.facets import afacet_counts
+from product.update import IMAGE_FIELDS, update_cars, delete_unreferenced_images, mark_variants_rendered
+from product.importer import CarImporter
+from shop.cache import gst_rate_table
 from car_shop.logger import logger
 from utils import AuthBearer
 
 router = Router(tags=["Product"], auth=AuthBearer())
 
+car_paginator = KeysetPaginator(ordering=("id", "price", "power", "milage"))
+search_paginator = KeysetPaginator(ordering=("rank", "id", "price"), default="-rank")
+# Compiled at startup, `fields=` is validated against the precomputed field names
+get_serializer(CarSchema, Car)
+
+def filter_cars(query_filter: CarQueryFilterSchema,
+                range_filter: CarRangeFilterSchema)-> tuple:
+    """
+    returns `(clean filter, queryset)` of the cars matching `GET product` filters
+    """
+    clean_filter: dict = {**query_filter.clean_null(), **range_filter.range_lookups()}
+    return clean_filter, Car.objects.filter(**clean_filter).all()
+
 @router.get("product", response=ResponseSchema)
 async def get_car_details(request,
-                          query_filter: CarQueryFilterSchema = Query(...)):
+                          http_response: HttpResponse,
+                          query_filter: CarQueryFilterSchema = Query(...),
+                          range_filter: CarRangeFilterSchema = Query(...),
+                          list_options: ListOptionsSchema = Query(...)):
     """
     **DB Query to filter car details based on query filter**
     - all query fields are optional
+    - range filters: **price_min, price_max, milage_min, milage_max, power_min, power_max,
+      seat_min, seat_max, version_min, version_max, rate_min, rate_max** (inclusive)
+    - results are keyset paginated, pass `next_cursor` as `cursor` to get the next page
+    - order_by: **id, price, power, milage**, every sort is backed by an index
+    - send `Accept: application/x-ndjson` to stream every matching row instead of one page
+    - pages are cached until a `Car` changes
+    - `ETag` / `Last-Modified` come from one aggregate query, a matching `If-None-Match` gets an empty `304`
     """
     response = ResponseSchema()
-    data: list = await response.dict_data(schema_model = CarSchema,
-                                    data = Car.objects.filter(**query_filter.clean_null()).all())
+    range_errors: dict = range_filter.range_errors()
+    if range_errors:
+        response.status_code = 400
+        response.error.update(range_errors)
+        return response
+    clean_filter, cars = filter_cars(query_filter, range_filter)
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return response.stream_ndjson(schema_model = CarSchema,
+                                      data = cars.order_by("pk"),
+                                      fields = list_options.fields)
+    cache_key: str = await response_cache.key("product", (Car,), query_filter = clean_filter, list_options = list_options.dict())
+    cached: dict = await response_cache.aget(cache_key)
+    validators: dict = cached["validators"] if cached is not None else \
+        await avalidators(cars, query_filter = clean_filter, list_options = list_options.dict())
+    if if_none_match(request, validators["ETag"]):
+        return not_modified(request, validators)
+    set_validators(http_response, validators)
+    if cached is not None:
+        return cached["response"]
+    data: list = await response.paginated_data(schema_model = CarSchema,
+                                               data = cars,
+                                               list_options = list_options,
+                                               paginator = car_paginator)
     response.data.extend(data)
+    await response_cache.aset(cache_key, response, validators)
+    return response
+
+@router.get("product/facets", response=ResponseSchema)
+async def get_car_facets(request,
+                         query_filter: CarQueryFilterSchema = Query(...),
+                         range_filter: CarRangeFilterSchema = Query(...)):
+    """
+    **DB query to count cars per facet value for the catalog sidebar**
+    - takes the same filters as `GET product`
+    - facets: **color, fuel_type, seat buckets, new_product, price buckets**, all counted in one
+      conditional aggregate query
+    - each facet ignores its own filter, e.g. with `fuel_type=petrol` the diesel count is still shown
+    - counts are cached per filter set until a `Car` changes
+    """
+    response = ResponseSchema()
+    range_errors: dict = range_filter.range_errors()
+    if range_errors:
+        response.status_code = 400
+        response.error.update(range_errors)
+        return response
+    clean_filter, _ = filter_cars(query_filter, range_filter)
+    cache_key: str = await response_cache.key("product/facets", (Car,), query_filter = clean_filter)
+    cached: dict = await response_cache.aget(cache_key)
+    if cached is not None:
+        return cached["response"]
+    facets: dict = await afacet_counts(clean_filter)
+    response.data.append(facets)
+    await response_cache.aset(cache_key, response)
     return response
 
 @router.get("product/search", response=ResponseSchema)
 async def search_car_details(request,
-                             query_filter: CarSearchFilterScheam = Query(...)):
+                             query_filter: CarSearchFilterScheam = Query(...),
+                             list_options: ListOptionsSchema = Query(...)):
     """
     **DB query to search car details based on query filter**
     - **Query options**
-     - search: **param that provide `case sensitive search`, `contains search`, `equal`**
+     - search: **text is prefix matched against name, engine and transmission and ranked by relevance,
+       numbers are matched `equal` against version, milage, seat, rate and power**
+    - results are ordered by relevance, order_by: **rank, id, price**
+    - send `Accept: application/x-ndjson` to stream every matching row instead of one page
+    - pages are cached until a `Car` changes
     """
     response = ResponseSchema()
     clean_filter: dict = query_filter.clean_null()
-    str_filter = None
-    integer_float_filter = None
-    if isinstance(clean_filter["search"], str):
-        str_filter = Q(name__icontains=clean_filter["search"]) | \
-                    Q(engine__icontains = clean_filter["search"]) | \
-                    Q(transmission__icontains = clean_filter["search"])
-    if isinstance(clean_filter["search"], int) or isinstance(clean_filter["search"], float):
-        integer_float_filter = Q(version = clean_filter["search"]) | \
-                                Q(milage = clean_filter["search"]) | \
-                                Q(seat = clean_filter["search"]) | \
-                                Q(rate = clean_filter["search"]) | \
-                                Q(power = clean_filter["search"])
-        
-    if str_filter is not None:
-        final_filter = str_filter
-    else:
-        final_filter = integer_float_filter
+    if not accepts(request, NDJSON_MEDIA_TYPE):
+        cache_key: str = await response_cache.key("product/search", (Car,), query_filter = clean_filter, list_options = list_options.dict())
+        cached: dict = await response_cache.aget(cache_key)
+        if cached is not None:
+            return cached["response"]
     # Removing search key, value from clean_filter 
-    del clean_filter["search"]
+    search = clean_filter.pop("search")
+    cars = Car.objects.filter(**clean_filter).all()
+    if isinstance(search, str):
+        car = await search_cars(queryset = cars, text = search)
+    else:
+        integer_float_filter = Q(version = search) | \
+                                Q(milage = search) | \
+                                Q(seat = search) | \
+                                Q(rate = search) | \
+                                Q(power = search)
+        car = cars.filter(integer_float_filter).annotate(rank = Value(0.0, output_field = FloatField()))
 
-    car = Car.objects.filter(final_filter, **clean_filter).all()
-    
-    data: list = await response.dict_data(schema_model = CarSchema,
-                              data = car)
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return response.stream_ndjson(schema_model = CarSchema,
+                                      data = car.order_by("-rank", "-pk"),
+                                      fields = list_options.fields)
+
+    data: list = await response.paginated_data(schema_model = CarSchema,
+                                               data = car,
+                                               list_options = list_options,
+                                               paginator = search_paginator)
     response.data.extend(data)
+    await response_cache.aset(cache_key, response)
     return response
 
 @router.get("product/price_calculation", response=ResponseSchema)
 async def get_car_price_calculation_data(request):
     """
-    **DB query to get car price calculation data**
+    **Car price calculation data from the cached GST rate table**
+    - rates are loaded in one DB query and kept in memory until a `Country` or `State` changes
     """
     response = ResponseSchema()
-    gst_chrages_result = []
-    async for country in Country.objects.all():
-        async for state in country.state.all():
-            gst_chrages_result.append({state.name: state.gst_chrages + country.gst_chrages})
+    gst_chrages_result: list = await gst_rate_table.aload()
     response.data.extend(gst_chrages_result)
     return response
 
@@ -83,6 +179,8 @@ async def add_car_details(request,
     """
     **DB query to add new car details**
     - all fields are required
+    - images are validated by content (jpeg / png magic bytes and header), not by client content type
+    - thumb / medium / large variants of every image are rendered on the image process pool
     """
     response = ResponseSchema()
     car: Car = Car(**payload.dict())
@@ -90,18 +188,26 @@ async def add_car_details(request,
         response.error.update({"product_image": "please upload 4 images"})
         return response
     
-    for file in product_images:
-        if file.content_type not in ["image/jpeg", "image/jpg", "image/png"]:
-            response.error.update({"product_image": f"does not support given file type: {file.content_type}"})
-            return response
+    try:
+        await avalidate_images(*product_images[:4])
+    except ImageValidationError as e:
+        response.status_code = 400
+        response.error.update({"product_image": str(e)})
+        return response
         
-    # Initlizating images from list of image 
-    car.image_one = product_images[0]
-    car.image_two = product_images[1]
-    car.image_three = product_images[2]
-    car.image_four = product_images[3]
-
-    # await car.asave()
+    # Initlizating images from list of image, the four files are written to storage concurrently
+    try:
+        await asave_images(car, {"image_one": product_images[0],
+                                 "image_two": product_images[1],
+                                 "image_three": product_images[2],
+                                 "image_four": product_images[3]})
+        await car.asave()
+    except Exception:
+        # Stored files of a car that was never saved are not referenced by anyone
+        await sync_to_async(delete_unreferenced_images)([getattr(car, field).name for field in IMAGE_FIELDS])
+        raise
+    rendered: list = await image_variant_pool.build(*[getattr(car, field).name for field in IMAGE_FIELDS])
+    await sync_to_async(mark_variants_rendered)(rendered)
     data: list = await response.dict_data(schema_model = CarSchema,
                                           data = Car.objects.aget(pk=car.id))
     response.data.extend(data)
@@ -121,28 +227,184 @@ async def update_car_details(request,
     **DB query to updated car details based on query filter**
     - all payload fields are optional
     - all query fields are optional
+    - matched cars are updated with one set-based `UPDATE`, uploaded images are stored once and shared
+    - an empty payload without images is a `400`
     """
     response = ResponseSchema()
-    clean_payload = payload.clean_empty()
+    clean_payload = {key: value for key, value in payload.clean_empty().items() if value is not None}
     Sequence = ("one", "two", "three", "four") 
+    image_files: dict = {}
     for index, item in enumerate([image1, image2, image3, image4]):
         if item is not None:
-            if item.content_type not in ["image/jpeg", "image/jpg", "image/png"]:
-                response.error.update({"product_image": f"does not support given image1 type: {item.content_type}"})
-                return response
-            clean_payload[f"image_{Sequence[index]}"] = item
-    
-    cars = Car.objects.filter(**query_filter.clean_null()).all()
-    # count: int = await cars.aupdate(***clean_payload)
-    # note this method not use for image of file field because does not call obj.save method
-    async for car in cars:
-        car.__dict__.update(**clean_payload)
-        await car.asave()
+            image_files[f"image_{Sequence[index]}"] = item
+    if not clean_payload and not image_files:
+        response.status_code = 400
+        response.error.update({"payload": "nothing to update, send at least one field or image"})
+        return response
+    try:
+        await avalidate_images(*image_files.values())
+    except ImageValidationError as e:
+        response.status_code = 400
+        response.error.update({"product_image": str(e)})
+        return response
+
+    # Each uploaded image is written to storage once and shared by every matched car
+    image_holder = Car()
+    await asave_images(image_holder, image_files)
+    image_names: dict = {key: getattr(image_holder, key).name for key in image_files}
+    clean_payload.update(image_names)
+
+    serializer = get_serializer(CarSchema, Car)
+    rows, replaced_images = await sync_to_async(update_cars)(query_filter = query_filter.clean_null(),
+                                                             values = clean_payload,
+                                                             lookups = serializer.lookups)
+    if not rows:
+        await sync_to_async(delete_unreferenced_images)(image_names.values())
+    else:
+        await sync_to_async(delete_unreferenced_images)(replaced_images)
+        rendered: list = await image_variant_pool.build(*image_names.values())
+        await sync_to_async(mark_variants_rendered)(rendered)
+        for row in rows:
+            row.update({rendered_field(field): True for field in image_names if row[field] in rendered})
+    # Queryset update does not send post_save
+    car_index.invalidate()
+    await response_cache.abump(Car)
 
+    response.data.extend(serializer.to_dict(row) for row in rows)
+    response.description = f'Total {len(response.data)} car details updated'
+    return response
+
+@router.post("product/import", response=ResponseSchema)
+async def import_car_details(request,
+                             file: UploadedFile = File(...),
+                             format: ImportFormat = None,
+                             batch_size: int = Query(1000, ge=1, le=10000)):
+    """
+    **Bulk import car details from a CSV or NDJSON file**
+    - every row is validated like `POST product` payload (images excluded)
+    - valid rows are inserted in batches of `batch_size`, invalid rows are reported and skipped
+    - format: **csv, ndjson**, defaults to the file extension
+    - a file that is not utf-8 or not valid csv stops at that line, rows before it stay imported
+    """
+    response = ResponseSchema()
+    if format is None:
+        format = ImportFormat.ndjson if file.name.endswith((".ndjson", ".jsonl")) else ImportFormat.csv
+    importer = CarImporter(batch_size = batch_size)
+    stream = io.TextIOWrapper(file.file, encoding = "utf-8", newline = "")
+    report: dict = await sync_to_async(importer.run)(stream, format)
+    response.data.append(report)
+    response.status_code = 201 if report["imported"] else 200
+    response.description = f"Total {report['imported']} car details imported, {report['failed']} rows failed"
+    return response
+
+@router.post("product/upload", response=ResponseSchema)
+async def create_chunked_upload(request,
+                                payload: ChunkedUploadSchema = Body(...)):
+    """
+    **Start a resumable car image upload**
+    - send the file with `PATCH product/upload/{upload_id}` in chunks, each with an `Upload-Offset` header
+    - after a failure get the received `offset` with `GET product/upload/{upload_id}` and resume from it
+    - the upload is only visible to its creator and expires after `UPLOAD_SESSION_TTL` seconds without a chunk
+    """
+    response = ResponseSchema()
+    try:
+        upload: ChunkedUpload = await sync_to_async(ChunkedUpload.create)(filename = payload.filename,
+                                                                          size = payload.size,
+                                                                          owner = request.auth["email"])
+    except ChunkedUploadError as e:
+        response.status_code = 400
+        response.error.update({"upload": str(e)})
+        return response
+    response.data.append({"upload_id": upload.upload_id, "offset": 0, "size": upload.size})
+    response.status_code = 201
+    response.description = "Upload created"
+    return response
+
+@router.get("product/upload/{upload_id}", response=ResponseSchema)
+async def get_chunked_upload(request,
+                             upload_id: str):
+    """
+    **Received bytes of a resumable upload**
+    """
+    response = ResponseSchema()
+    try:
+        upload: ChunkedUpload = await sync_to_async(ChunkedUpload)(upload_id, owner = request.auth["email"])
+    except ChunkedUploadError as e:
+        response.status_code = 404
+        response.error.update({"upload": str(e)})
+        return response
+    response.data.append({"upload_id": upload.upload_id, "offset": upload.offset, "size": upload.size})
+    return response
+
+@router.patch("product/upload/{upload_id}", response=ResponseSchema)
+async def append_chunked_upload(request,
+                                upload_id: str):
+    """
+    **Append one chunk to a resumable upload**
+    - raw request body is the chunk, `Upload-Offset` header is its position in the file
+    - chunk size is limited by `UPLOAD_CHUNK_MAX_SIZE`
+    """
+    response = ResponseSchema()
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        response.status_code = 400
+        response.error.update({"offset": "Upload-Offset header is required"})
+        return response
+    chunk: bytes = request.body
+    if len(chunk) > settings.UPLOAD_CHUNK_MAX_SIZE:
+        response.status_code = 400
+        response.error.update({"chunk": f"chunk is larger than {settings.UPLOAD_CHUNK_MAX_SIZE} bytes"})
+        return response
+    try:
+        upload: ChunkedUpload = await sync_to_async(ChunkedUpload)(upload_id, owner = request.auth["email"])
+        new_offset: int = await sync_to_async(upload.append, thread_sensitive=False)(offset, chunk)
+    except ChunkedUploadError as e:
+        response.status_code = 409
+        response.error.update({"upload": str(e)})
+        return response
+    response.data.append({"upload_id": upload.upload_id, "offset": new_offset, "size": upload.size})
+    return response
+
+@router.post("product/upload/{upload_id}/complete", response=ResponseSchema)
+async def complete_chunked_upload(request,
+                                  upload_id: str,
+                                  car: int,
+                                  slot: ImageSlot):
+    """
+    **Finish a resumable upload and attach it as one of the car images**
+    - slot: **one, two, three, four**
+    """
+    response = ResponseSchema()
+    try:
+        existing_car: Car = await Car.objects.aget(pk = car)
+    except Car.DoesNotExist:
+        response.status_code = 404
+        response.error.update({"car": "car not find with given id"})
+        return response
+    try:
+        upload: ChunkedUpload = await sync_to_async(ChunkedUpload)(upload_id, owner = request.auth["email"])
+        file = await sync_to_async(upload.open, thread_sensitive=False)()
+    except (ChunkedUploadError, ImageValidationError) as e:
+        response.status_code = 400
+        response.error.update({"upload": str(e)})
+        return response
+    field_name = f"image_{slot.value}"
+    try:
+        await asave_images(existing_car, {field_name: file})
+        await existing_car.asave(update_fields = [field_name, rendered_field(field_name), "updated_at"])
+    except Exception:
+        await sync_to_async(delete_unreferenced_images)([getattr(existing_car, field_name).name])
+        raise
+    finally:
+        file.close()
+    await sync_to_async(upload.delete)()
+    rendered: list = await image_variant_pool.build(getattr(existing_car, field_name).name)
+    await sync_to_async(mark_variants_rendered)(rendered)
     data: list = await response.dict_data(schema_model = CarSchema,
-                                    data = Car.objects.filter(**query_filter.clean_null()).all())
+                                          data = Car.objects.filter(pk = existing_car.pk))
     response.data.extend(data)
-    response.description = f'Total {len(response.data)} car details updated'
+    response.description = f"Car {field_name} uploaded"
     return response
 
 @router.delete("product")
@@ -0,0 +1,115 @@
+from django.db.models import Count, Q
+
+from product.models import Car, color_choice
+
+FACETS = ("color", "fuel_type", "seat", "new_product", "price")
+# (label, lower bound inclusive, upper bound exclusive), None for open ends
+PRICE_BUCKETS = (
+    ("0-500000", None, 500000),
+    ("500000-1000000", 500000, 1000000),
+    ("1000000-2000000", 1000000, 2000000),
+    ("2000000-5000000", 2000000, 5000000),
+    ("5000000+", 5000000, None),
+)
+SEAT_BUCKETS = (
+    ("1-2", None, 3),
+    ("3-4", 3, 5),
+    ("5", 5, 6),
+    ("6-7", 6, 8),
+    ("8+", 8, None),
+)
+
+
+def bucket_filter(field: str,
+                  low,
+                  high)-> Q:
+    """
+    `low <= field < high` condition, an open end is left out
+    """
+    condition = Q()
+    if low is not None:
+        condition &= Q(**{f"{field}__gte": low})
+    if high is not None:
+        condition &= Q(**{f"{field}__lt": high})
+    return condition
+
+
+def split_filters(lookups: dict)-> tuple:
+    """
+    `(common lookups, {facet: Q})`, lookups on a facet field are kept apart so that facet can ignore them
+    """
+    common: dict = {}
+    facet_filters: dict = {facet: Q() for facet in FACETS}
+    for (key, value) in lookups.items():
+        field: str = key.split("__", 1)[0]
+        if field in facet_filters:
+            facet_filters[field] &= Q(**{key: value})
+        else:
+            common[key] = value
+    return common, facet_filters
+
+
+def count(condition: Q)-> Count:
+    return Count("pk", filter=condition) if condition else Count("pk")
+
+
+def facet_aggregates(facet_filters: dict)-> dict:
+    """
+    one conditional `Count` per facet value, aliased `<facet>__<position>`
+    - every facet is narrowed by the filters of the other facets but not by its own,
+      with `fuel_type=petrol` the diesel count stays visible so the sidebar can switch or multi-select
+    """
+    def others(facet: str = None)-> Q:
+        condition = Q()
+        for (name, facet_filter) in facet_filters.items():
+            if name != facet:
+                condition &= facet_filter
+        return condition
+
+    aggregates: dict = {"total": count(others())}
+    for (position, (value, _)) in enumerate(color_choice):
+        aggregates[f"color__{position}"] = count(others("color") & Q(color=value))
+    for (position, (value, _)) in enumerate(Car._meta.get_field("fuel_type").choices):
+        aggregates[f"fuel_type__{position}"] = count(others("fuel_type") & Q(fuel_type=value))
+    for (position, (_, low, high)) in enumerate(SEAT_BUCKETS):
+        aggregates[f"seat__{position}"] = count(others("seat") & bucket_filter("seat", low, high))
+    aggregates["new_product__0"] = count(others("new_product") & Q(new_product=True))
+    aggregates["new_product__1"] = count(others("new_product") & Q(new_product=False))
+    for (position, (_, low, high)) in enumerate(PRICE_BUCKETS):
+        aggregates[f"price__{position}"] = count(others("price") & bucket_filter("price", low, high))
+    return aggregates
+
+
+def group_facets(row: dict)-> dict:
+    """
+    `{facet: {value: count}}` from the aggregate row
+    """
+    labels: dict = {
+        "color": [value for (value, _) in color_choice],
+        "fuel_type": [value for (value, _) in Car._meta.get_field("fuel_type").choices],
+        "seat": [label for (label, _, _) in SEAT_BUCKETS],
+        "new_product": ["true", "false"],
+        "price": [label for (label, _, _) in PRICE_BUCKETS],
+    }
+    facets: dict = {"total": row["total"]}
+    for (facet, values) in labels.items():
+        facets[facet] = {value: row[f"{facet}__{position}"] for (position, value) in enumerate(values)}
+    return facets
+
+
+def facet_counts(lookups: dict)-> dict:
+    """
+    car counts per color, fuel_type, seat bucket, new_product and price bucket for `GET product` lookups
+    - every facet is computed in one aggregate query, lookups on other fields filter the rows
+    - `total` is the number of cars matching every lookup
+    """
+    common, facet_filters = split_filters(lookups)
+    return group_facets(Car.objects.filter(**common).aggregate(**facet_aggregates(facet_filters)))
+
+
+async def afacet_counts(lookups: dict)-> dict:
+    """
+    async version of `facet_counts`
+    """
+    common, facet_filters = split_filters(lookups)
+    return group_facets(await Car.objects.filter(**common).aaggregate(**facet_aggregates(facet_filters)))
@@ -0,0 +1,127 @@
+from django.db import DatabaseError, transaction
+from pydantic import ValidationError
+
+import csv
+import json
+import time
+
+from product.models import Car
+from product.request import CarPostSchema, ImportFormat
+from car_shop.cache import response_cache
+from product.search import car_index
+
+
+class CarImporter:
+    """
+    Streaming bulk car import
+    - rows are read one at a time from a CSV / NDJSON text stream and validated with `CarPostSchema`
+    - valid rows are inserted with `bulk_create`, `batch_size` rows per transaction
+    - invalid rows are reported with their line number and never abort the import
+    - an undecodable or malformed file stops reading at the current line, batches already
+      inserted stay and the partial report is returned
+    """
+
+    def __init__(self,
+                 batch_size: int = 1000,
+                 max_errors: int = 1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.imported: int = 0
+        self.failed: int = 0
+        self.errors: list = []
+        # Last line read, a read error is reported on the line after it
+        self.line_number: int = 0
+
+    def rows(self,
+             stream,
+             format: ImportFormat):
+        """
+        yield (line number, row dict) from a text stream
+        """
+        if format == ImportFormat.csv:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                # Empty cells fall back to schema defaults
+                yield reader.line_num, {key: value for key, value in row.items() if value not in ("", None)}
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, e
+                    continue
+                yield line_number, row
+
+    def add_error(self,
+                  line_number: int,
+                  errors)-> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": line_number, "errors": errors})
+
+    def insert(self,
+               batch: list)-> None:
+        """
+        insert one batch, on a database error retry row by row to isolate the failing rows
+        """
+        try:
+            with transaction.atomic():
+                Car.objects.bulk_create([car for (_, car) in batch])
+            self.imported += len(batch)
+            return
+        except DatabaseError:
+            pass
+        for line_number, car in batch:
+            try:
+                with transaction.atomic():
+                    car.pk = None
+                    car.save(force_insert=True)
+                self.imported += 1
+            except DatabaseError as e:
+                self.add_error(line_number, str(e))
+
+    def run(self,
+            stream,
+            format: ImportFormat)-> dict:
+        """
+        import every row of the stream, returns the import report
+        """
+        start = time.perf_counter()
+        batch: list = []
+        try:
+            try:
+                for line_number, row in self.rows(stream, format):
+                    self.line_number = line_number
+                    if not isinstance(row, dict):
+                        self.add_error(line_number, f"invalid row: {row}")
+                        continue
+                    try:
+                        car = Car(**CarPostSchema(**row).dict())
+                    except ValidationError as e:
+                        self.add_error(line_number, e.errors())
+                        continue
+                    batch.append((line_number, car))
+                    if len(batch) >= self.batch_size:
+                        self.insert(batch)
+                        batch = []
+            except UnicodeDecodeError:
+                self.add_error(self.line_number + 1, "file should be utf-8 encoded, import stopped")
+            except csv.Error as e:
+                self.add_error(self.line_number + 1, f"invalid csv: {e}, import stopped")
+            if batch:
+                self.insert(batch)
+        finally:
+            if self.imported:
+                # bulk_create does not send post_save, committed batches are visible even if a later one raised
+                car_index.invalidate()
+                response_cache.bump(Car)
+        elapsed = time.perf_counter() - start
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round((self.imported + self.failed) / elapsed) if elapsed else 0,
+        }
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import time
+
+from car_shop.serializers import get_serializer
+from product.models import Car
+from product.request import CarSchema
+from product.update import update_cars
+
+
+class Command(BaseCommand):
+    help = "Compare per row `save()` and the set-based update of `product/update`, seeded rows are rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        rows_count: int = options["rows"]
+        query_filter: dict = {"name": "Benchmark Model"}
+        with transaction.atomic():
+            Car.objects.bulk_create([
+                Car(name="Benchmark Model", version=1, price=100000, fuel_type="petrol", milage=15,
+                    engine="1.2L", transmission="Manual", seat=5, color="blue", rate=4, power=90)
+                for _ in range(rows_count)
+            ], batch_size=2000)
+
+            # Previous update_car_details implementation
+            start = time.perf_counter()
+            for car in Car.objects.filter(**query_filter):
+                car.__dict__.update(price=110000)
+                car.save()
+            per_row = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rows, _ = update_cars(query_filter=query_filter,
+                                  values={"price": 120000},
+                                  lookups=get_serializer(CarSchema, Car).lookups)
+            set_based = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"rows: {rows_count}")
+        self.stdout.write(f"per row save(): {per_row:.2f}s")
+        self.stdout.write(f"set-based update: {set_based:.2f}s ({len(rows)} rows returned)")
+        self.stdout.write(f"speedup: {per_row / set_based:.1f}x")
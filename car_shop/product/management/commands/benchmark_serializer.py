@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models.fields.files import ImageField
+
+from datetime import datetime, timezone
+import time
+
+from car_shop.serializers import get_serializer
+from product.models import Car
+from product.request import CarSchema
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of reflection based `from_orm` serialization and the precompiled serializer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        rows_count: int = options["rows"]
+        row: dict = {
+            "id": 1, "name": "Nexon", "version": 2.0, "price": 1200000.0, "fuel_type": "petrol",
+            "milage": 17, "engine": "1.2L Turbo", "transmission": "Manual", "seat": 5,
+            "color": "blue", "rate": 4, "power": 118.0, "new_product": True,
+            "image_one": "car_image/one.jpg", "image_two": "car_image/two.jpg",
+            "image_three": "car_image/three.jpg", "image_four": "car_image/four.jpg",
+            "image_one_rendered": True, "image_two_rendered": True,
+            "image_three_rendered": True, "image_four_rendered": True,
+            "updated_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        }
+        cars: list = [Car(**{**row, "id": index}) for index in range(rows_count)]
+        rows: list = [{**row, "id": index} for index in range(rows_count)]
+
+        # Previous ResponseSchema.get_full_image_path implementation
+        def reflection(obj: Car)-> dict:
+            dict_data = CarSchema.from_orm(obj).dict()
+            for field in obj.__class__._meta.get_fields():
+                if isinstance(field, ImageField) and getattr(obj, field.name) is not None:
+                    dict_data[field.name] = f"http://localhost:8000{getattr(obj, field.name).url}"
+            return dict_data
+
+        serializer = get_serializer(CarSchema, Car)
+
+        start = time.perf_counter()
+        for car in cars:
+            reflection(car)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for item in rows:
+            serializer.to_dict(item)
+        after = time.perf_counter() - start
+
+        self.stdout.write(f"rows: {rows_count}")
+        self.stdout.write(f"from_orm + get_fields: {rows_count / before:,.0f} rows/sec")
+        self.stdout.write(f"precompiled serializer: {rows_count / after:,.0f} rows/sec")
+        self.stdout.write(f"speedup: {before / after:.1f}x")
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from car_shop.images import render_variants
+from product.update import mark_variants_rendered
+from user.models import UserImage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class Command(BaseCommand):
+    help = "Backfill thumb / medium / large variants for images stored in media/car_image and media/avatar"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--directories", nargs="+", default=["car_image", "avatar"])
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--force", action="store_true", help="re-render variants that already exist")
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        names: list = []
+        for directory in options["directories"]:
+            base = os.path.join(media_root, directory)
+            if not os.path.isdir(base):
+                continue
+            for filename in sorted(os.listdir(base)):
+                path = os.path.join(base, filename)
+                if os.path.isfile(path) and filename.lower().endswith(IMAGE_EXTENSIONS):
+                    names.append(os.path.join(directory, filename))
+
+        written: int = 0
+        failed: int = 0
+        rendered: list = []
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {executor.submit(render_variants, media_root, name, options["force"]): name for name in names}
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                    rendered.append(futures[future])
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {e}")
+        # Serializers read the rendered flags, they never look at storage
+        for start in range(0, len(rendered), 1000):
+            batch: list = rendered[start:start + 1000]
+            mark_variants_rendered(batch)
+            UserImage.objects.filter(avatar__in=batch).update(avatar_rendered=True)
+        self.stdout.write(f"{len(names)} images, {written} variants written, {failed} failed")
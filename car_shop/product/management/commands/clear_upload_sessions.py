@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from car_shop.uploads import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable upload sessions idle for more than UPLOAD_SESSION_TTL seconds, run it from cron"
+
+    def handle(self, *args, **options):
+        deleted: int = ChunkedUpload.delete_expired()
+        self.stdout.write(f"{deleted} expired upload session files deleted")
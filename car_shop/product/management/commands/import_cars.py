@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import json
+import sys
+
+from product.importer import CarImporter
+from product.request import ImportFormat
+
+
+class Command(BaseCommand):
+    help = "Bulk import cars from a CSV or NDJSON file, use `-` to read from stdin"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=[item.value for item in ImportFormat], default=None,
+                            help="defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path: str = options["path"]
+        format_name = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        importer = CarImporter(batch_size=options["batch_size"])
+        try:
+            if path == "-":
+                report: dict = importer.run(sys.stdin, ImportFormat(format_name))
+            else:
+                with open(path, encoding="utf-8", newline="") as stream:
+                    report: dict = importer.run(stream, ImportFormat(format_name))
+        except OSError as e:
+            raise CommandError(str(e))
+        for error in report.pop("errors"):
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'], default=str)}")
+        self.stdout.write(json.dumps(report))
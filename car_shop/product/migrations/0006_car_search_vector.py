@@ -0,0 +1,57 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_EXPRESSION = """
+    setweight(to_tsvector('simple', coalesce({table}.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({table}.engine, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({table}.transmission, '')), 'C')
+"""
+
+
+def create_search_vector_trigger(apps, schema_editor):
+    """
+    PostgreSQL only: maintain `search_vector` with a trigger, backfill it and add the GIN index
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION product_car_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_EXPRESSION.format(table="NEW")};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER product_car_search_vector_trigger
+        BEFORE INSERT OR UPDATE ON product_car
+        FOR EACH ROW EXECUTE FUNCTION product_car_search_vector_update();
+    """)
+    schema_editor.execute(f"UPDATE product_car SET search_vector = {SEARCH_VECTOR_EXPRESSION.format(table='product_car')};")
+    schema_editor.execute("CREATE INDEX product_car_search_vector_gin ON product_car USING gin (search_vector);")
+
+
+def drop_search_vector_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_car_search_vector_gin;")
+    schema_editor.execute("DROP TRIGGER IF EXISTS product_car_search_vector_trigger ON product_car;")
+    schema_editor.execute("DROP FUNCTION IF EXISTS product_car_search_vector_update();")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_car_image_four_car_image_one_car_image_three_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vector_trigger, drop_search_vector_trigger),
+    ]
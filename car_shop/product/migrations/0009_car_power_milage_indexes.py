@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_car_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['power', 'id'], name='car_power_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['milage', 'id'], name='car_milage_id_idx'),
+        ),
+    ]
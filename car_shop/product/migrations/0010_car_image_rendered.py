@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_car_power_milage_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='image_one_rendered',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_two_rendered',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_three_rendered',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_four_rendered',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
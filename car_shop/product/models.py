@@ -1,5 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.contrib.postgres.search import SearchVectorField
+from django_cleanup import cleanup
 
 color_choice = [
                 ('read', 'Read'),
@@ -9,6 +11,9 @@ color_choice = [
                 ('white', 'White')
             ]
 
+# Image files can be shared by many cars (set-based update), product.update deletes them by reference count,
+# on delete and when `save()` replaces them
+@cleanup.ignore
 class Car(models.Model):
     name = models.CharField(blank=False, null=False, max_length=250)
     version = models.FloatField(validators=[MinValueValidator(1)])
@@ -26,6 +31,28 @@ class Car(models.Model):
     image_two = models.ImageField(blank=True, null=True, upload_to="car_image")
     image_three = models.ImageField(blank=True, null=True, upload_to="car_image")
     image_four = models.ImageField(blank=True, null=True, upload_to="car_image")
+    # Set once the thumb / medium / large variants of the image are rendered, reset when the image changes
+    image_one_rendered = models.BooleanField(default=False, editable=False)
+    image_two_rendered = models.BooleanField(default=False, editable=False)
+    image_three_rendered = models.BooleanField(default=False, editable=False)
+    image_four_rendered = models.BooleanField(default=False, editable=False)
+    # Weighted name / engine / transmission tsvector, kept up to date by a DB trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Set on save and by every set-based update, drives conditional GET validators
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Composites put the equality filter first so `price` range / ordering can use the same index
+        indexes = [
+            models.Index(fields=["price"], name="car_price_idx"),
+            models.Index(fields=["fuel_type", "price"], name="car_fuel_type_price_idx"),
+            models.Index(fields=["color", "price"], name="car_color_price_idx"),
+            models.Index(fields=["new_product", "price"], name="car_new_product_price_idx"),
+            models.Index(fields=["seat", "price"], name="car_seat_price_idx"),
+            # `order_by` power / milage, pk breaks keyset ties
+            models.Index(fields=["power", "id"], name="car_power_id_idx"),
+            models.Index(fields=["milage", "id"], name="car_milage_id_idx"),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}'
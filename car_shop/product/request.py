@@ -1,5 +1,7 @@
 from ninja import ModelSchema, Schema
+from pydantic import Field
 from typing import Union
+from enum import Enum
 
 from product.models import Car
 from car_shop.request import Color, FuelType
@@ -13,7 +15,8 @@ class CarPostSchema(ModelSchema):
     class Config:
         model = Car
         model_fields = "__all__"
-        model_exclude = ["id", "image_one", "image_two", "image_three", "image_four"]
+        model_exclude = ["id", "image_one", "image_two", "image_three", "image_four", "search_vector", "updated_at",
+                         "image_one_rendered", "image_two_rendered", "image_three_rendered", "image_four_rendered"]
 
 class CarUpdateSchema(ModelSchema, BaseQueryFilter):
     """ 
@@ -30,7 +33,8 @@ class CarUpdateSchema(ModelSchema, BaseQueryFilter):
     class Config:
         model = Car
         model_fields = "__all__"
-        model_exclude = ["id", "image_one", "image_two", "image_three", "image_four"]
+        model_exclude = ["id", "image_one", "image_two", "image_three", "image_four", "search_vector", "updated_at",
+                         "image_one_rendered", "image_two_rendered", "image_three_rendered", "image_four_rendered"]
         model_fields_optional = "__all__"
 
     def clean_empty(self):
@@ -43,6 +47,7 @@ class CarSchema(ModelSchema):
     class Config:
         model = Car
         model_fields = "__all__"
+        model_exclude = ["search_vector", "image_one_rendered", "image_two_rendered", "image_three_rendered", "image_four_rendered"]
         model_fields_optional = "__all__"
 
 class CarQueryFilterSchema(ModelSchema, BaseQueryFilter):
@@ -55,8 +60,49 @@ class CarQueryFilterSchema(ModelSchema, BaseQueryFilter):
     class Config:
         model = Car
         model_fields = "__all__"
+        model_exclude = ["search_vector", "updated_at", "image_one_rendered", "image_two_rendered", "image_three_rendered", "image_four_rendered"]
         model_fields_optional = "__all__"
 
+class CarRangeFilterSchema(BaseQueryFilter):
+    """
+    car range filter schema
+    - `<field>_min` / `<field>_max` are inclusive bounds
+    """
+    price_min: float = Field(None, ge=0)
+    price_max: float = Field(None, ge=0)
+    milage_min: int = Field(None, ge=0)
+    milage_max: int = Field(None, ge=0)
+    power_min: float = Field(None, ge=0)
+    power_max: float = Field(None, ge=0)
+    seat_min: int = Field(None, ge=0)
+    seat_max: int = Field(None, ge=0)
+    version_min: float = Field(None, ge=0)
+    version_max: float = Field(None, ge=0)
+    rate_min: int = Field(None, ge=0)
+    rate_max: int = Field(None, ge=0)
+
+    def range_lookups(self)-> dict:
+        """
+        ORM lookups of the given bounds, e.g. `price_min` -> `price__gte`
+        """
+        lookups: dict = {}
+        for (key, value) in self.clean_null().items():
+            field, _, bound = key.rpartition("_")
+            lookups[f"{field}__{'gte' if bound == 'min' else 'lte'}"] = value
+        return lookups
+
+    def range_errors(self)-> dict:
+        """
+        `{<field>_min: message}` for every range whose lower bound is above its upper bound
+        """
+        bounds: dict = self.clean_null()
+        errors: dict = {}
+        for key in bounds:
+            field, _, bound = key.rpartition("_")
+            if bound == "min" and f"{field}_max" in bounds and bounds[key] > bounds[f"{field}_max"]:
+                errors[key] = f"{field}_min should not be greater than {field}_max"
+        return errors
+
 class CarSearchFilterScheam(BaseQueryFilter):
     """
     Car Search Schema
@@ -64,4 +110,27 @@ class CarSearchFilterScheam(BaseQueryFilter):
     search: Union[str, int, float]
     color: Color = None
     fuel_type: FuelType = None
-    price: float = None
\ No newline at end of file
+    price: float = None
+
+class ChunkedUploadSchema(Schema):
+    """
+    Resumable upload request body
+    """
+    filename: str
+    size: int = Field(..., gt=0)
+
+class ImageSlot(Enum):
+    """
+    `Car image fields`
+    """
+    one: str = "one"
+    two: str = "two"
+    three: str = "three"
+    four: str = "four"
+
+class ImportFormat(Enum):
+    """
+    `Supported bulk import formats`
+    """
+    csv: str = "csv"
+    ndjson: str = "ndjson"
@@ -0,0 +1,122 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, QuerySet, Value, When
+
+from asgiref.sync import sync_to_async
+from bisect import bisect_left
+from threading import Lock
+import re
+
+from product.models import Car
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Same relative weights as the A / B / C labels of the PostgreSQL search vector
+FIELD_WEIGHTS = (("name", 1.0), ("engine", 0.4), ("transmission", 0.2))
+
+
+def tokenize(text: str)-> list:
+    """
+    lower case word tokens of a text
+    """
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class InvertedIndex:
+    """
+    Pure python inverted index over car name / engine / transmission
+    - fallback search backend for non PostgreSQL databases (SQLite test runs)
+    - every query token is prefix matched, all query tokens should match
+    - invalidated by `Car` save and delete signals, rebuilt on next search
+    """
+
+    def __init__(self):
+        # (postings: token -> {car id: weight}, sorted tokens)
+        self._index: tuple = None
+        self._generation: int = 0
+        self._lock = Lock()
+
+    def invalidate(self, **kwargs)-> None:
+        with self._lock:
+            self._generation += 1
+            self._index = None
+
+    def invalidate_on_commit(self, using: str = None, **kwargs)-> None:
+        """
+        `post_save` / `post_delete` receiver, drops the index after the write commits so
+        a rebuild never reads uncommitted state
+        """
+        transaction.on_commit(self.invalidate, using=using)
+
+    def build(self)-> tuple:
+        """
+        build (postings, sorted tokens) unless already built
+        """
+        index = self._index
+        if index is not None:
+            return index
+        generation = self._generation
+        postings: dict = {}
+        for row in Car.objects.values_list("id", *[name for (name, _) in FIELD_WEIGHTS]):
+            car_id = row[0]
+            for (_, weight), text in zip(FIELD_WEIGHTS, row[1:]):
+                for token in tokenize(text):
+                    scores = postings.setdefault(token, {})
+                    scores[car_id] = max(scores.get(car_id, 0.0), weight)
+        index = (postings, sorted(postings))
+        with self._lock:
+            # Skip caching when an invalidation happened while rows were loading
+            if generation == self._generation:
+                self._index = index
+        return index
+
+    def search(self,
+               text: str)-> dict:
+        """
+        returns {car id: score} for cars matching every token of the text
+        """
+        postings, tokens = self.build()
+        result: dict = None
+        for query_token in tokenize(text):
+            matches: dict = {}
+            position = bisect_left(tokens, query_token)
+            while position < len(tokens) and tokens[position].startswith(query_token):
+                for car_id, weight in postings[tokens[position]].items():
+                    matches[car_id] = max(matches.get(car_id, 0.0), weight)
+                position += 1
+            if result is None:
+                result = matches
+            else:
+                result = {car_id: score + matches[car_id] for car_id, score in result.items() if car_id in matches}
+            if not result:
+                return {}
+        return result or {}
+
+
+car_index = InvertedIndex()
+
+
+def postgres_search(queryset: QuerySet,
+                    text: str)-> QuerySet:
+    """
+    GIN index backed prefix search ranked with `ts_rank`
+    """
+    query = SearchQuery(" & ".join(f"{token}:*" for token in tokenize(text)),
+                        search_type="raw",
+                        config="simple")
+    return queryset.filter(search_vector=query) \
+                   .annotate(rank=SearchRank(F("search_vector"), query))
+
+async def search_cars(queryset: QuerySet,
+                      text: str)-> QuerySet:
+    """
+    filter car queryset by text search and annotate it with a relevance `rank`
+    """
+    if not tokenize(text):
+        return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    if connection.vendor == "postgresql":
+        return postgres_search(queryset=queryset, text=text)
+    scores: dict = await sync_to_async(car_index.search)(text)
+    return queryset.filter(pk__in=list(scores)) \
+                   .annotate(rank=Case(*[When(pk=car_id, then=Value(score)) for car_id, score in scores.items()],
+                                       default=Value(0.0),
+                                       output_field=FloatField()))
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django_cleanup.signals import cleanup_post_delete
+
+from car_shop.cache import response_cache
+from car_shop.images import delete_variants
+from product.models import Car
+from product.search import car_index
+from product.update import delete_car_images, delete_replaced_car_images, remember_car_images, reset_rendered_images
+
+
+def delete_image_variants(sender, file, **kwargs)-> None:
+    """
+    remove variants together with the original image django_cleanup deleted
+    """
+    if file and file.name:
+        delete_variants(file.name)
+
+
+def connect_signals()-> None:
+    """
+    connect product cache invalidation receivers
+    """
+    post_save.connect(car_index.invalidate_on_commit, sender=Car, dispatch_uid="car_index_save")
+    post_delete.connect(car_index.invalidate_on_commit, sender=Car, dispatch_uid="car_index_delete")
+    post_save.connect(response_cache.invalidate, sender=Car, dispatch_uid="response_cache_save_Car")
+    post_delete.connect(response_cache.invalidate, sender=Car, dispatch_uid="response_cache_delete_Car")
+    post_delete.connect(delete_car_images, sender=Car, dispatch_uid="delete_car_images")
+    post_init.connect(remember_car_images, sender=Car, dispatch_uid="remember_car_images")
+    pre_save.connect(reset_rendered_images, sender=Car, dispatch_uid="reset_rendered_images")
+    post_save.connect(delete_replaced_car_images, sender=Car, dispatch_uid="delete_replaced_car_images")
+    # Any model django_cleanup manages, user avatars
+    cleanup_post_delete.connect(delete_image_variants, dispatch_uid="delete_image_variants")
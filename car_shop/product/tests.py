@@ -1,3 +1,473 @@
-from django.test import TestCase
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+import io
+import os
+import tempfile
+import time
 
-# Create your tests here.
+from car_shop.request import ListOptionsSchema
+from car_shop.response import ResponseSchema
+from car_shop.pagination import encode_cursor
+from car_shop.testing import QueryPlanTestMixin
+from car_shop.cache import response_cache
+from car_shop.serializers import get_serializer
+from car_shop.uploads import ChunkedUpload, ChunkedUploadError, ImageValidationError
+from product.api import car_paginator, filter_cars
+from product.facets import facet_counts
+from product.search import car_index, postgres_search, search_cars
+from product.update import mark_variants_rendered, update_cars
+from product.models import Car, color_choice
+from product.importer import CarImporter
+from product.request import CarSchema, CarQueryFilterSchema, CarRangeFilterSchema, ImportFormat
+
+CAR_COUNT = 20000
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans are checked on PostgreSQL only")
+class CarQueryPlanTest(QueryPlanTestMixin, TestCase):
+    """
+    `GET product` queries should be served by an index, never by a sequential scan
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Car.objects.bulk_create([
+            Car(name=f"Car {index}",
+                version=1 + index % 5,
+                price=100000 + index * 10,
+                fuel_type="petrol" if index % 2 else "diesel",
+                milage=10 + index % 30,
+                engine=f"{1 + index % 3}.0L",
+                transmission="Manual" if index % 3 else "Automatic",
+                seat=9 if index % 200 == 0 else 5,
+                color=color_choice[index % len(color_choice)][0],
+                rate=index % 5,
+                power=50 + index % 300,
+                new_product=index % 100 == 0)
+            for index in range(CAR_COUNT)
+        ], batch_size=2000)
+        cls.analyze(Car._meta.db_table)
+
+    def page(self,
+             list_options: ListOptionsSchema = ListOptionsSchema(),
+             range_filter: CarRangeFilterSchema = CarRangeFilterSchema(),
+             **query_filter):
+        """
+        page queryset exactly as `GET product` builds it
+        """
+        _, cars = filter_cars(CarQueryFilterSchema(**query_filter), range_filter)
+        return ResponseSchema().page_queryset(schema_model=CarSchema,
+                                              data=cars,
+                                              list_options=list_options,
+                                              paginator=car_paginator)
+
+    def test_price_filter(self):
+        self.assertNoSeqScan(self.page(price=150000), Car._meta.db_table)
+
+    def test_fuel_type_price_filter(self):
+        self.assertNoSeqScan(self.page(fuel_type="Petrol", price=150010), Car._meta.db_table)
+
+    def test_color_price_filter(self):
+        self.assertNoSeqScan(self.page(color="Blue", price=150030), Car._meta.db_table)
+
+    def test_new_product_filter(self):
+        self.assertNoSeqScan(self.page(new_product=True), Car._meta.db_table)
+
+    def test_seat_filter(self):
+        self.assertNoSeqScan(self.page(seat=9), Car._meta.db_table)
+
+    def test_order_by_price(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="price")), Car._meta.db_table)
+
+    def test_order_by_price_deep_page(self):
+        cursor = encode_cursor("price", 100000 + (CAR_COUNT - 500) * 10, CAR_COUNT - 500)
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="price", cursor=cursor)), Car._meta.db_table)
+
+    def test_price_range_order_by_price(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="price"),
+                                       CarRangeFilterSchema(price_min=150000, price_max=152000)),
+                             Car._meta.db_table)
+
+    def test_order_by_power(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="power")), Car._meta.db_table)
+
+    def test_order_by_power_desc(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="-power")), Car._meta.db_table)
+
+    def test_power_range_order_by_power(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="power"),
+                                       CarRangeFilterSchema(power_min=300)),
+                             Car._meta.db_table)
+
+    def test_price_range_order_by_power(self):
+        page = self.page(ListOptionsSchema(order_by="power"),
+                         CarRangeFilterSchema(price_min=120000, price_max=280000))
+        self.assertNoSeqScan(page, Car._meta.db_table)
+        self.assertUsesIndex(page, "car_power_id_idx")
+
+    def test_price_range_order_by_power_desc(self):
+        page = self.page(ListOptionsSchema(order_by="-power"),
+                         CarRangeFilterSchema(price_min=120000, price_max=280000))
+        self.assertNoSeqScan(page, Car._meta.db_table)
+        self.assertUsesIndex(page, "car_power_id_idx")
+
+    def test_order_by_power_deep_page(self):
+        cursor = encode_cursor("power", 340, CAR_COUNT - 500)
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="power", cursor=cursor)), Car._meta.db_table)
+
+    def test_order_by_milage(self):
+        self.assertNoSeqScan(self.page(ListOptionsSchema(order_by="milage")), Car._meta.db_table)
+
+
+class CarRangeFilterTest(TestCase):
+    """
+    `<field>_min` / `<field>_max` query params to ORM lookups
+    """
+
+    def test_range_lookups(self):
+        range_filter = CarRangeFilterSchema(price_min=100, price_max=200, power_min=50)
+        self.assertEqual(range_filter.range_lookups(),
+                         {"price__gte": 100, "price__lte": 200, "power__gte": 50})
+
+    def test_min_above_max(self):
+        range_filter = CarRangeFilterSchema(milage_min=20, milage_max=10, seat_min=2)
+        self.assertEqual(list(range_filter.range_errors()), ["milage_min"])
+
+
+class CarFacetTest(TestCase):
+    """
+    `GET product/facets` counts every facet in one query
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Car.objects.bulk_create([
+            Car(name=f"Car {index}",
+                version=1,
+                price=300000 + index * 400000,
+                fuel_type="petrol" if index % 2 else "diesel",
+                milage=10,
+                engine="1.0L",
+                transmission="Manual",
+                seat=(2, 5, 7)[index % 3],
+                color=color_choice[index % len(color_choice)][0],
+                rate=1,
+                power=50,
+                new_product=index == 0)
+            for index in range(6)
+        ])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            facet_counts({})
+
+    def test_counts(self):
+        facets = facet_counts({})
+        self.assertEqual(facets["total"], 6)
+        self.assertEqual(facets["fuel_type"], {"petrol": 3, "diesel": 3})
+        self.assertEqual(facets["seat"], {"1-2": 2, "3-4": 0, "5": 2, "6-7": 2, "8+": 0})
+        self.assertEqual(facets["new_product"], {"true": 1, "false": 5})
+        self.assertEqual(facets["price"], {"0-500000": 1, "500000-1000000": 1, "1000000-2000000": 3,
+                                           "2000000-5000000": 1, "5000000+": 0})
+        self.assertEqual(sum(facets["color"].values()), 6)
+
+    def test_facet_ignores_its_own_filter(self):
+        facets = facet_counts({"fuel_type": "petrol"})
+        self.assertEqual(facets["total"], 3)
+        self.assertEqual(facets["fuel_type"], {"petrol": 3, "diesel": 3})
+        self.assertEqual(facets["seat"], {"1-2": 1, "3-4": 0, "5": 1, "6-7": 1, "8+": 0})
+
+    def test_other_facet_filters_apply(self):
+        facets = facet_counts({"fuel_type": "petrol", "price__gte": 1000000})
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["fuel_type"], {"petrol": 2, "diesel": 2})
+        self.assertEqual(facets["price"], {"0-500000": 0, "500000-1000000": 1, "1000000-2000000": 1,
+                                           "2000000-5000000": 1, "5000000+": 0})
+
+    def test_filtered_one_query(self):
+        with self.assertNumQueries(1):
+            facet_counts({"fuel_type": "petrol", "seat__lte": 5, "name": "Car 1"})
+
+
+class CarCacheInvalidationTest(TestCase):
+    """
+    `Car` writes invalidate cached responses and the search index only once they commit
+    """
+
+    def create_car(self)-> Car:
+        return Car.objects.create(name="Car", version=1, price=100000, fuel_type="petrol", milage=10,
+                                  engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+
+    def test_response_cache_bumped_on_commit(self):
+        key: str = response_cache.version_key(Car)
+        response_cache.cache.set(key, 1, timeout=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_car()
+            self.assertEqual(response_cache.cache.get(key), 1)
+        self.assertEqual(response_cache.cache.get(key), 2)
+
+    def test_search_index_dropped_on_commit(self):
+        car_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_car()
+            self.assertIsNotNone(car_index._index)
+        self.assertIsNone(car_index._index)
+
+
+class CarImageCleanupTest(TestCase):
+    """
+    images no car references anymore are deleted once per transaction
+    """
+
+    def create_car(self, image: str)-> Car:
+        return Car.objects.create(name="Car", version=1, price=100000, fuel_type="petrol", milage=10,
+                                  engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50,
+                                  image_one=image)
+
+    def test_queryset_delete_checks_references_once(self):
+        for index in range(3):
+            self.create_car(f"car_image/car_{index}.jpg")
+        with mock.patch("product.update.delete_unreferenced_images") as delete_images:
+            with self.captureOnCommitCallbacks(execute=True):
+                Car.objects.all().delete()
+        delete_images.assert_called_once()
+        self.assertEqual(set(delete_images.call_args.args[0]),
+                         {"car_image/car_0.jpg", "car_image/car_1.jpg", "car_image/car_2.jpg"})
+
+    def test_save_deletes_replaced_image(self):
+        car = self.create_car("car_image/old.jpg")
+        car = Car.objects.get(pk=car.pk)
+        car.image_one = "car_image/new.jpg"
+        with mock.patch("product.update.delete_unreferenced_images") as delete_images:
+            with self.captureOnCommitCallbacks(execute=True):
+                car.save()
+        delete_images.assert_called_once()
+        self.assertEqual(set(delete_images.call_args.args[0]), {"car_image/old.jpg"})
+
+    def test_empty_update_locks_nothing(self):
+        self.create_car("car_image/car.jpg")
+        with self.assertNumQueries(0):
+            rows, replaced_images = update_cars(query_filter={}, values={}, lookups=["name"])
+        self.assertEqual((rows, replaced_images), ([], set()))
+
+    def test_variants_read_rendered_flag(self):
+        car = self.create_car("car_image/car.jpg")
+        serializer = get_serializer(CarSchema, Car)
+        row: dict = Car.objects.values(*serializer.lookups).get(pk=car.pk)
+        self.assertEqual(serializer.to_dict(row)["image_one_variants"]["thumb"]["webp"],
+                         "http://localhost:8000/media/car_image/car.jpg")
+        mark_variants_rendered(["car_image/car.jpg"])
+        row = Car.objects.values(*serializer.lookups).get(pk=car.pk)
+        self.assertTrue(row["image_one_rendered"])
+        self.assertFalse(row["image_two_rendered"])
+        self.assertIn("car.jpg_thumb.webp", serializer.to_dict(row)["image_one_variants"]["thumb"]["webp"])
+
+    def test_replaced_image_resets_rendered_flag(self):
+        car = self.create_car("car_image/old.jpg")
+        mark_variants_rendered(["car_image/old.jpg"])
+        car = Car.objects.get(pk=car.pk)
+        car.image_one = "car_image/new.jpg"
+        with mock.patch("product.update.delete_unreferenced_images"):
+            car.save()
+        self.assertFalse(Car.objects.get(pk=car.pk).image_one_rendered)
+
+
+class CarSearchTest(TestCase):
+    """
+    `product/search` ranking, name matches rank above engine, engine above transmission
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Car.objects.bulk_create([
+            Car(name=name, version=1, price=100000, fuel_type="petrol", milage=10, engine=engine,
+                transmission=transmission, seat=5, color="blue", rate=1, power=50)
+            for (name, engine, transmission) in [
+                ("Maruti Swift", "1.2L petrol", "Manual"),
+                ("Tata Nexon", "1.5L swift petrol", "Manual"),
+                ("Honda City", "1.5L diesel", "Swiftshift Automatic"),
+                ("Hyundai Creta", "1.5L diesel", "Manual"),
+            ]
+        ])
+
+    def setUp(self):
+        # Rows seeded inside the test transaction never commit, drop any index built by another test
+        car_index.invalidate()
+
+    def ranked(self, text: str)-> list:
+        """
+        car names in `product/search` order on the test database backend
+        """
+        cars = async_to_sync(search_cars)(Car.objects.all(), text)
+        return list(cars.order_by("-rank", "-pk").values_list("name", flat=True))
+
+    def index_ranked(self, text: str)-> list:
+        """
+        car names in inverted index score order
+        """
+        scores: dict = car_index.search(text)
+        names: dict = dict(Car.objects.filter(pk__in=list(scores)).values_list("pk", "name"))
+        return [names[pk] for pk in sorted(scores, key=lambda pk: (-scores[pk], -pk))]
+
+    def test_field_weights(self):
+        self.assertEqual(self.ranked("swift"), ["Maruti Swift", "Tata Nexon", "Honda City"])
+
+    def test_every_token_should_match(self):
+        # ts_rank also weighs token proximity for multi token queries, only the matches are compared
+        self.assertCountEqual(self.ranked("swift petrol"), ["Maruti Swift", "Tata Nexon"])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.ranked("swi"), self.ranked("swift"))
+
+    def test_no_tokens(self):
+        self.assertEqual(self.ranked(" - "), [])
+
+    def test_inverted_index_ordering(self):
+        self.assertEqual(self.index_ranked("swift"), ["Maruti Swift", "Tata Nexon", "Honda City"])
+        self.assertEqual(self.index_ranked("swift petrol"), ["Maruti Swift", "Tata Nexon"])
+        self.assertEqual(self.index_ranked("creta"), ["Hyundai Creta"])
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector search runs on PostgreSQL only")
+    def test_postgres_matches_inverted_index_ordering(self):
+        for text in ("swift", "petrol", "manual"):
+            ranked: list = list(postgres_search(Car.objects.all(), text).order_by("-rank", "-pk")
+                                                                        .values_list("name", flat=True))
+            self.assertEqual(ranked, self.index_ranked(text), msg=text)
+
+    def test_index_sees_saved_car(self):
+        self.assertEqual(self.index_ranked("baleno"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Car.objects.create(name="Maruti Baleno", version=1, price=100000, fuel_type="petrol", milage=10,
+                               engine="1.2L petrol", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+        self.assertEqual(self.index_ranked("baleno"), ["Maruti Baleno"])
+
+    def test_index_drops_deleted_car(self):
+        self.assertEqual(self.index_ranked("creta"), ["Hyundai Creta"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Car.objects.filter(name="Hyundai Creta").delete()
+        self.assertEqual(self.index_ranked("creta"), [])
+
+
+class CarImportTest(TestCase):
+    """
+    `product/import` row validation, batch fallback and partial reports
+    """
+    header: str = "name,version,price,fuel_type,milage,engine,transmission,seat,color,rate,power\n"
+
+    def line(self, name: str, price: str = "500000")-> str:
+        return f"{name},1,{price},petrol,15,1.2L,Manual,5,blue,4,80\n"
+
+    def run_import(self, data: bytes, batch_size: int = 1000)-> dict:
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline="")
+        return CarImporter(batch_size=batch_size).run(stream, ImportFormat.csv)
+
+    def test_invalid_rows_are_reported(self):
+        data: str = self.header + self.line("Nexon") + self.line("Broken", price="cheap") + self.line("Punch")
+        report: dict = self.run_import(data.encode())
+        self.assertEqual((report["imported"], report["failed"]), (2, 1))
+        self.assertEqual(report["errors"][0]["row"], 3)
+        self.assertEqual(set(Car.objects.values_list("name", flat=True)), {"Nexon", "Punch"})
+
+    def test_batch_failure_falls_back_to_rows(self):
+        save = Car.save
+
+        def failing_save(car, *args, **kwargs):
+            if car.name == "Broken":
+                raise DatabaseError("broken row")
+            return save(car, *args, **kwargs)
+
+        data: str = self.header + self.line("Nexon") + self.line("Broken") + self.line("Punch")
+        with mock.patch.object(Car.objects, "bulk_create", side_effect=DatabaseError("batch failed")), \
+             mock.patch.object(Car, "save", failing_save):
+            report: dict = self.run_import(data.encode())
+        self.assertEqual((report["imported"], report["failed"]), (2, 1))
+        self.assertEqual(report["errors"], [{"row": 3, "errors": "broken row"}])
+        self.assertEqual(set(Car.objects.values_list("name", flat=True)), {"Nexon", "Punch"})
+
+    def test_decode_error_returns_partial_report(self):
+        # Larger than one TextIOWrapper read, the first rows decode before the invalid byte is reached
+        lines: list = [self.line(f"Car {index}") for index in range(500)]
+        data: bytes = (self.header + "".join(lines)).encode() + b"\xff\xfe,1\n"
+        with mock.patch("product.importer.car_index.invalidate") as invalidate:
+            report: dict = self.run_import(data, batch_size=50)
+        self.assertGreater(report["imported"], 0)
+        self.assertEqual(report["failed"], 1)
+        self.assertEqual(report["errors"][-1]["row"], report["imported"] + 2)
+        self.assertIn("utf-8", report["errors"][-1]["errors"])
+        self.assertEqual(Car.objects.count(), report["imported"])
+        invalidate.assert_called_once()
+
+
+class ChunkedUploadTest(TestCase):
+    """
+    resumable upload sessions, offsets, expiry, ownership and image validation
+    """
+
+    def setUp(self):
+        self.session_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(UPLOAD_SESSION_DIR=self.session_dir.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.session_dir.cleanup()
+
+    def image(self, size: tuple = (20, 20))-> bytes:
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "blue").save(buffer, "PNG")
+        return buffer.getvalue()
+
+    def create(self, data: bytes, owner: str = "owner@example.com")-> ChunkedUpload:
+        return ChunkedUpload.create(filename="car.png", size=len(data), owner=owner)
+
+    def test_resume_at_offset(self):
+        data: bytes = self.image()
+        upload: ChunkedUpload = self.create(data)
+        self.assertEqual(upload.append(0, data[:50]), 50)
+        with self.assertRaisesMessage(ChunkedUploadError, "offset should be 50"):
+            upload.append(0, data[:50])
+        with self.assertRaisesMessage(ChunkedUploadError, "upload is incomplete"):
+            upload.open()
+        self.assertEqual(upload.append(50, data[50:]), len(data))
+        with upload.open() as file:
+            self.assertEqual(file.read(), data)
+
+    def test_larger_than_declared_size(self):
+        data: bytes = self.image()
+        upload: ChunkedUpload = self.create(data)
+        with self.assertRaisesMessage(ChunkedUploadError, "larger than the declared size"):
+            upload.append(0, data + b"\0")
+
+    def test_other_owner_can_not_resume(self):
+        upload: ChunkedUpload = self.create(self.image())
+        with self.assertRaisesMessage(ChunkedUploadError, "unknown upload id"):
+            ChunkedUpload(upload.upload_id, owner="other@example.com")
+        self.assertEqual(ChunkedUpload(upload.upload_id, owner="owner@example.com").offset, 0)
+
+    def test_idle_session_expires(self):
+        upload: ChunkedUpload = self.create(self.image())
+        idle: float = time.time() - settings.UPLOAD_SESSION_TTL - 1
+        for path in (upload.meta_path, upload.part_path):
+            os.utime(path, (idle, idle))
+        with self.assertRaisesMessage(ChunkedUploadError, "upload expired"):
+            ChunkedUpload(upload.upload_id, owner="owner@example.com")
+        self.assertEqual(os.listdir(self.session_dir.name), [])
+
+    def test_magic_bytes_checked_on_first_chunk(self):
+        data: bytes = b"GIF89a" + bytes(100)
+        upload: ChunkedUpload = self.create(data)
+        with self.assertRaisesMessage(ChunkedUploadError, "not a jpeg or png"):
+            upload.append(0, data)
+
+    def test_pixel_count_checked_before_decoding(self):
+        data: bytes = self.image(size=(200, 200))
+        upload: ChunkedUpload = self.create(data)
+        upload.append(0, data)
+        with override_settings(MAX_IMAGE_PIXELS=100 * 100):
+            with self.assertRaisesMessage(ImageValidationError, "more than 10000 pixels"):
+                upload.open()
@@ -0,0 +1,142 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from car_shop.cache import response_cache
+from car_shop.images import delete_variants, rendered_field
+from car_shop.logger import logger
+from product.models import Car
+
+IMAGE_FIELDS = ("image_one", "image_two", "image_three", "image_four")
+
+
+def update_cars(query_filter: dict,
+                values: dict,
+                lookups: list)-> tuple:
+    """
+    set-based car update
+    - matched rows are read once (locked with `SELECT ... FOR UPDATE`) and updated with one
+      `UPDATE ... WHERE pk IN (...)`, no per row `save()`
+    - returns the matched `values()` rows with the new values applied, plus the replaced image names
+    - empty `values` updates nothing and returns no rows, nothing is locked
+    """
+    if not values:
+        return [], set()
+    lookups = list(dict.fromkeys([*lookups, "pk", *IMAGE_FIELDS]))
+    # Queryset update skips `auto_now`, a new image has no rendered variants yet
+    values = {**values,
+              **{rendered_field(field): False for field in IMAGE_FIELDS if field in values},
+              "updated_at": timezone.now()}
+    with transaction.atomic():
+        rows: list = list(Car.objects.filter(**query_filter).select_for_update().values(*lookups))
+        if rows:
+            Car.objects.filter(pk__in=[row["pk"] for row in rows]).update(**values)
+    replaced_images: set = set()
+    for row in rows:
+        for key, value in values.items():
+            if key in IMAGE_FIELDS and row[key] and row[key] != value:
+                replaced_images.add(row[key])
+            row[key] = value
+    return rows, replaced_images
+
+def mark_variants_rendered(names)-> int:
+    """
+    set `<field>_rendered` of every car image in `names`, one `UPDATE` for all four fields
+    - `updated_at` moves and cached responses are dropped, the variant urls of these cars change
+    """
+    names: list = [name for name in names if name]
+    if not names:
+        return 0
+    matches = Q()
+    for field in IMAGE_FIELDS:
+        matches |= Q(**{f"{field}__in": names})
+    updated: int = Car.objects.filter(matches).update(
+        **{rendered_field(field): Case(When(**{f"{field}__in": names}, then=True),
+                                       default=F(rendered_field(field)))
+           for field in IMAGE_FIELDS},
+        updated_at=timezone.now())
+    response_cache.bump(Car)
+    return updated
+
+def delete_unreferenced_images(names)-> None:
+    """
+    delete stored car images (and their variants) no car references anymore
+    - one image file can be shared by many cars after a set-based update
+    """
+    names: set = {name for name in names if name}
+    if not names:
+        return
+    references = Q()
+    for field in IMAGE_FIELDS:
+        references |= Q(**{f"{field}__in": names})
+    referenced: set = set()
+    for row in Car.objects.filter(references).values_list(*IMAGE_FIELDS):
+        referenced.update(row)
+    for name in names - referenced:
+        try:
+            default_storage.delete(name)
+            delete_variants(name)
+        except OSError as e:
+            logger.error(f"failed to delete image {name}: {e}")
+
+def queue_unreferenced_images(names,
+                              using: str = None)-> None:
+    """
+    `delete_unreferenced_images` once the current transaction commits
+    - names queued in one transaction are collected in one set and checked with one query on commit
+    - outside a transaction they are checked right away
+    """
+    names: set = {name for name in names if name}
+    if not names:
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        delete_unreferenced_images(names)
+        return
+    pending = getattr(connection, "pending_car_images", None)
+    # Commit runs and clears the callback, rollback discards it, both start a new set
+    if pending is None or not any(func is pending[1] for (_, func, _) in connection.run_on_commit):
+        queued: set = set()
+        pending = (queued, lambda: delete_unreferenced_images(queued))
+        connection.pending_car_images = pending
+        transaction.on_commit(pending[1], using=using)
+    pending[0].update(names)
+
+def remember_car_images(sender, instance: Car, **kwargs)-> None:
+    """
+    post_init receiver, keep the loaded image names to find replaced ones on save
+    - deferred image fields are left out, reading them would cost a query
+    """
+    # Raw `__dict__` values (name or FieldFile), the descriptor would wrap every one in a FieldFile
+    instance._loaded_images = {field: getattr(instance.__dict__[field], "name", instance.__dict__[field])
+                               for field in IMAGE_FIELDS if field in instance.__dict__}
+
+def reset_rendered_images(sender, instance: Car, raw: bool = False, update_fields=None, **kwargs)-> None:
+    """
+    pre_save receiver, a replaced image has no rendered variants yet
+    """
+    if raw:
+        return
+    loaded: dict = getattr(instance, "_loaded_images", {})
+    for field in IMAGE_FIELDS:
+        if field in loaded and getattr(instance, field).name != loaded[field]:
+            setattr(instance, rendered_field(field), False)
+
+def delete_replaced_car_images(sender, instance: Car, using: str, raw: bool = False, **kwargs)-> None:
+    """
+    post_save receiver, delete images a saved car no longer references after commit unless other cars share them
+    - `Car` is ignored by django_cleanup because set-based updates share image files between cars
+    """
+    loaded: dict = getattr(instance, "_loaded_images", {})
+    if not raw:
+        # Flags of a replaced image belong to the old file, they are reset in `reset_rendered_images`
+        queue_unreferenced_images([name for (field, name) in loaded.items()
+                                   if name and getattr(instance, field).name != name], using=using)
+    remember_car_images(sender, instance)
+
+def delete_car_images(sender, instance: Car, using: str, **kwargs)-> None:
+    """
+    post_delete receiver, delete images of a deleted car after commit unless other cars share them
+    """
+    queue_unreferenced_images([getattr(instance, field).name for field in IMAGE_FIELDS], using=using)
@@ -1,41 +1,124 @@
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.db.models import Count, QuerySet
+from django.http import HttpResponse
+from django.db.models.functions import TruncMonth
 from ninja import Router, Query, Body
-from typing import Union
+from typing import Union, List
+from datetime import date, datetime, time, timedelta
 import calendar
 
-from sale.request import SalesPostSchema, SalesSchema, SalseResponseSchema, SalesGraphSchema
-from car_shop.response import ResponseSchema
+from sale.request import SalesPostSchema, SalesSchema, SalseResponseSchema, SalesGraphSchema, SalesGraphQuerySchema
+from car_shop.response import ResponseSchema, accepts, if_none_match, avalidators, set_validators, not_modified, \
+    NDJSON_MEDIA_TYPE
+from car_shop.request import ListOptionsSchema
+from car_shop.serializers import get_serializer
+from car_shop.cache import response_cache
 from product.models import Car
 from sale.models import Order
 from utils import AuthBearer
 
 router = Router(tags=["Sales"], auth=AuthBearer())
 
+MAX_ORDER_BATCH_SIZE = 1000
+# Longest `sales/graph` range, every car gets one bucket per month
+MAX_GRAPH_MONTHS = 12 * 10
+# Compiled at startup, `fields=` is validated against the precomputed field names
+get_serializer(SalseResponseSchema, Order)
+
+def filter_orders(query_filter: SalesSchema)-> tuple:
+    """
+    returns `(clean filter, queryset)` of `GET sales`, customer and car are joined
+    """
+    clean_filter: dict = query_filter.clean_null()
+    return clean_filter, Order.objects.filter(**clean_filter).select_related("car", "customer")
+
+def monthly_order_counts(start: date,
+                         end: date)-> QuerySet:
+    """
+    `{"car_id", "month", "count"}` rows of orders between the inclusive `start` / `end` dates
+    - one aggregation query, the half open datetime range keeps the order_date filter sargable
+    - `end` = `date.max` has no next day, the range is left open above
+    """
+    date_filter: dict = {"order_date__gte": timezone.make_aware(datetime.combine(start, time.min))}
+    if end < date.max:
+        date_filter["order_date__lt"] = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    return Order.objects.filter(car__isnull = False, **date_filter) \
+                        .annotate(month = TruncMonth("order_date")) \
+                        .values("car_id", "month") \
+                        .annotate(count = Count("id")) \
+                        .order_by()
+
 @router.get("sales", response=ResponseSchema)
-async def get_sales_details(request, query_filter: SalesSchema = Query(...)):
+async def get_sales_details(request,
+                            http_response: HttpResponse,
+                            query_filter: SalesSchema = Query(...),
+                            list_options: ListOptionsSchema = Query(...)):
     """
     **DB query to get order details based on query filter**
+    - results are keyset paginated, pass `next_cursor` as `cursor` to get the next page
+    - send `Accept: application/x-ndjson` to stream every matching row instead of one page
+    - `ETag` / `Last-Modified` cover the orders and their cars, the `ETag` also changes with any `User` edit
+      (customers have no timestamp), a matching `If-None-Match` gets an empty `304`
     """
     response = ResponseSchema()
-    orders = Order.objects.filter(**query_filter.clean_null()).select_related("car", "customer")
-    data: list = await response.dict_data(schema_model = SalseResponseSchema,
-                                          data = orders)
+    clean_filter, orders = filter_orders(query_filter)
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return response.stream_ndjson(schema_model = SalseResponseSchema,
+                                      data = orders.order_by("pk"),
+                                      fields = list_options.fields)
+    validators: dict = await avalidators(orders,
+                                         timestamps = ("updated_at", "car__updated_at"),
+                                         customer_version = await response_cache.version(User),
+                                         query_filter = clean_filter,
+                                         list_options = list_options.dict())
+    if if_none_match(request, validators["ETag"]):
+        return not_modified(request, validators)
+    set_validators(http_response, validators)
+    data: list = await response.paginated_data(schema_model = SalseResponseSchema,
+                                               data = orders,
+                                               list_options = list_options)
     response.data.extend(data)
-    print(query_filter.clean_null())
     return response
 
 @router.get("sales/graph", response=ResponseSchema)
-async def get_graph_data(request):
+async def get_graph_data(request,
+                         query_filter: SalesGraphQuerySchema = Query(...)):
     """
     **DB query for sales graph data**
+    - monthly order count per car, grouped in a single aggregation query
+    - **Query options**
+     - year: **calendar year to report**
+     - from, to: **inclusive date range, defaults to the current year, at most 10 years**
     """
     response = ResponseSchema()
-    cars = Car.objects.all()
-    async for car in cars:
-        sales_graph_response: SalesGraphSchema = SalesGraphSchema(label = car.name)
-        for month_number in range(1, 13):
-            count: int = await car.order.filter(order_date__month = month_number).acount()
-            sales_graph_response.data.append({calendar.month_name[month_number]: count})
+    start, end = query_filter.date_range()
+    if start > end:
+        response.status_code = 400
+        response.error.update({"from": "from date should be before to date"})
+        return response
+    if (end.year - start.year) * 12 + end.month - start.month + 1 > MAX_GRAPH_MONTHS:
+        response.status_code = 400
+        response.error.update({"to": f"date range should cover at most {MAX_GRAPH_MONTHS // 12} years"})
+        return response
+
+    # Every (year, month) bucket between start and end, labels carry the year only if range spans years
+    months: list = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    single_year = start.year == end.year
+
+    counts: dict = {}
+    async for row in monthly_order_counts(start, end):
+        counts[(row["car_id"], row["month"].year, row["month"].month)] = row["count"]
+
+    async for car_id, car_name in Car.objects.values_list("id", "name").order_by("id"):
+        sales_graph_response: SalesGraphSchema = SalesGraphSchema(label = car_name)
+        for year, month in months:
+            label = calendar.month_name[month] if single_year else f"{calendar.month_name[month]} {year}"
+            sales_graph_response.data.append({label: counts.get((car_id, year, month), 0)})
         response.data.append(sales_graph_response.dict())
     return response
 
@@ -68,6 +151,51 @@ async def add_order_details(request, payload: SalesPostSchema = Body(...)):
     response.description = "Sales details successfuly added"
     return response
 
+@router.post("sales/batch", response=ResponseSchema)
+async def add_order_batch(request, payload: List[SalesPostSchema] = Body(...)):
+    """
+    **DB query to add a batch of order details**
+    - every car and customer id of the batch is resolved with one `in_bulk` query each
+    - orders are inserted with one `bulk_create`, nothing is inserted if any order is invalid
+    - errors are keyed by the position of the order in the batch
+    """
+    response = ResponseSchema()
+    if len(payload) > MAX_ORDER_BATCH_SIZE:
+        response.status_code = 400
+        response.error.update({"orders": f"batch should not have more than {MAX_ORDER_BATCH_SIZE} orders"})
+        return response
+    clean_orders: list = [item.clean_null() for item in payload]
+    cars: dict = await Car.objects.ain_bulk({item.get("car") for item in clean_orders if item.get("car") is not None})
+    customers: dict = await User.objects.ain_bulk({item.get("customer") for item in clean_orders if item.get("customer") is not None})
+
+    errors: dict = {}
+    for index, item in enumerate(clean_orders):
+        order_errors: dict = {}
+        if item.get("car") not in cars:
+            order_errors["car"] = "car not find with given id"
+        if item.get("customer") not in customers:
+            order_errors["user"] = "user not find with given id"
+        if order_errors:
+            errors[str(index)] = order_errors
+    if errors:
+        response.status_code = 400
+        response.error.update(errors)
+        return response
+
+    now = timezone.now()
+    orders: list = [Order(**{**item,
+                             "car": cars[item["car"]],
+                             "customer": customers[item["customer"]],
+                             "order_date": item.get("order_date", now)})
+                    for item in clean_orders]
+    await Order.objects.abulk_create(orders)
+    # Car and customer objects are already attached, response is built without querying again
+    serializer = get_serializer(SalseResponseSchema, Order)
+    response.data.extend(serializer.from_instance(order) for order in orders)
+    response.status_code = 201
+    response.description = f"Total {len(orders)} sales details successfuly added"
+    return response
+
 @router.patch("sales", response=ResponseSchema)
 async def update_order_details(request,
                                query_filter: SalesSchema = Query(...),
@@ -92,11 +220,11 @@ async def update_order_details(request,
         response.status_code = 400
         response.error.update({"user": "user not find with given id"})
         return response
-    count = await orders.aupdate(**clean_payload)
-    data: list = await response.dict_data(schema_model = SalseResponseSchema,
-                                          data = Order.objects.filter(**query_filter.clean_null()).all().select_related("car", "customer"))
+    data: list = await response.updated_data(schema_model = SalseResponseSchema,
+                                             data = orders,
+                                             values = clean_payload)
     response.data.extend(data)
-    response.description = f'Total {count} sales details updated'
+    response.description = f'Total {len(data)} sales details updated'
     return response
 
 @router.delete("sales", response=ResponseSchema)
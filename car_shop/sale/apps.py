@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SaleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sale'
+
+    def ready(self):
+        from sale.signals import connect_signals
+        connect_signals()
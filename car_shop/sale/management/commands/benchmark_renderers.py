@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datetime import datetime, timezone
+from ninja.renderers import JSONRenderer
+import gzip
+import time
+
+from car_shop.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from car_shop.serializers import get_serializer
+from sale.models import Order
+from sale.request import SalseResponseSchema
+
+
+class Command(BaseCommand):
+    help = "Compare encode time and body size of the default JSON renderer, orjson and MessagePack on a sales page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--format", choices=["rows", "columnar"], default="rows")
+        parser.add_argument("--cars", type=int, default=10, help="distinct cars across the orders")
+
+    def handle(self, *args, **options):
+        orders_count: int = options["orders"]
+        repeat: int = options["repeat"]
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        row: dict = {
+            "id": 1, "payment_method": "upi", "payment_status": "complete", "order_date": now, "updated_at": now,
+            "car": 1, "car__id": 1, "car__name": "Nexon", "car__version": 2.0, "car__price": 1200000.0,
+            "car__fuel_type": "petrol", "car__milage": 17, "car__engine": "1.2L Turbo",
+            "car__transmission": "Manual", "car__seat": 5, "car__color": "blue", "car__rate": 4,
+            "car__power": 118.0, "car__new_product": True, "car__updated_at": now,
+            "car__image_one": "car_image/one.jpg", "car__image_two": "car_image/two.jpg",
+            "car__image_three": "car_image/three.jpg", "car__image_four": "car_image/four.jpg",
+            "customer": 1, "customer__username": "customer", "customer__email": "customer@example.com",
+        }
+        serializer = get_serializer(SalseResponseSchema, Order)
+        missing: set = set(serializer.lookups) - set(row)
+        if missing:
+            raise CommandError(f"benchmark row is missing lookups: {', '.join(sorted(missing))}")
+        cars_count: int = max(1, options["cars"])
+        rows: list = [{**row, "id": index, "car": index % cars_count, "car__id": index % cars_count}
+                      for index in range(orders_count)]
+        payload: dict = {"status_code": 200, "error": {}, "description": None, "data": [], "next_cursor": None}
+
+        start = time.perf_counter()
+        if options["format"] == "columnar":
+            # Same layout `ResponseSchema.paginated_data` builds, related objects serialized once per pk
+            payload["columns"] = serializer.columns(rows)
+            payload["related"] = {}
+            for (name, fk_lookup, nested) in serializer.relations:
+                payload["related"][name] = {item[fk_lookup]: nested.to_dict(item)
+                                            for item in {item[fk_lookup]: item for item in rows}.values()}
+        else:
+            payload["data"] = [serializer.to_dict(item) for item in rows]
+        serialize = time.perf_counter() - start
+
+        renderers: list = [("ninja JSONRenderer", JSONRenderer())]
+        if orjson is not None:
+            renderers.append(("ORJSONRenderer", ORJSONRenderer()))
+        else:
+            self.stdout.write("orjson is not installed, skipping ORJSONRenderer")
+        if msgpack is not None:
+            renderers.append(("MessagePackRenderer", MessagePackRenderer()))
+        else:
+            self.stdout.write("msgpack is not installed, skipping MessagePackRenderer")
+
+        self.stdout.write(f"orders: {orders_count}, distinct cars: {cars_count}, format: {options['format']}, best of {repeat}")
+        self.stdout.write(f"serializer: {serialize * 1000:,.1f} ms")
+        baseline: float = None
+        for (name, renderer) in renderers:
+            best: float = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                content = renderer.render(None, payload, response_status=200)
+                best = min(best, time.perf_counter() - start)
+            if isinstance(content, str):
+                content = content.encode()
+            baseline = baseline or best
+            self.stdout.write(f"{name}: {best * 1000:,.1f} ms, {len(content):,} bytes, "
+                              f"{len(gzip.compress(content)):,} bytes gzipped, {baseline / best:.1f}x")
@@ -22,6 +22,14 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=250, blank=False, null=False, choices=methods_options)
     payment_status = models.CharField(max_length=250, blank=False, null=False, choices=status_options)
     order_date = models.DateTimeField(default=timezone.now(), blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order_date"], name="order_date_idx"),
+            models.Index(fields=["payment_status", "order_date"], name="order_status_date_idx"),
+            models.Index(fields=["payment_method", "order_date"], name="order_method_date_idx"),
+        ]
 
     def __str__(self) -> str:
         return f'{self.customer}_{self.car}'
\ No newline at end of file
@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import datetime, date
 from django.utils import timezone
 from ninja import ModelSchema, Schema
+from pydantic import Field
 from typing import List
 
 from car_shop.request import BaseQueryFilter, PaymentMethod, PaymentStatus
@@ -40,6 +41,7 @@ class SalseResponseSchema(Schema):
     payment_method: str
     payment_status: str
     order_date: datetime
+    updated_at: datetime = None
 
 class SalesGraphSchema(Schema):
     """
@@ -48,3 +50,29 @@ class SalesGraphSchema(Schema):
     label: str = None
     data: List = []
 
+class SalesGraphQuerySchema(BaseQueryFilter):
+    """
+    Sales graph query filter schema
+    - `year`: calendar year to report, takes precedence over `from`/`to`
+    - `from`, `to`: inclusive date range, defaults to the current year, `sales/graph` allows at most 10 years
+    """
+    year: int = Field(None, ge=1, le=9999)
+    from_date: date = Field(None, alias="from")
+    to_date: date = Field(None, alias="to")
+
+    def date_range(self)-> tuple:
+        """
+        resolve query params to an inclusive (start, end) date range
+        """
+        if self.year is not None:
+            return date(self.year, 1, 1), date(self.year, 12, 31)
+        today = timezone.localdate()
+        start = self.from_date
+        end = self.to_date
+        if start is None and end is None:
+            return date(today.year, 1, 1), date(today.year, 12, 31)
+        if start is None:
+            start = date(end.year, 1, 1)
+        if end is None:
+            end = date(start.year, 12, 31)
+        return start, end
@@ -0,0 +1,13 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+
+from car_shop.cache import response_cache
+
+
+def connect_signals()-> None:
+    """
+    connect sale cache invalidation receivers
+    - orders embed their `customer`, which has no `updated_at`, its version goes into the sales ETag
+    """
+    post_save.connect(response_cache.invalidate, sender=User, dispatch_uid="response_cache_save_User")
+    post_delete.connect(response_cache.invalidate, sender=User, dispatch_uid="response_cache_delete_User")
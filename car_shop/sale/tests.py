@@ -1,3 +1,274 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from unittest import skipUnless
+from asgiref.sync import async_to_sync
+from datetime import date, datetime, timedelta
+import json
 
-# Create your tests here.
+from car_shop.request import ListOptionsSchema
+from car_shop.response import ResponseSchema
+from car_shop.testing import QueryPlanTestMixin
+from product.models import Car
+from sale.api import add_order_batch, filter_orders, get_graph_data, monthly_order_counts
+from sale.models import Order
+from sale.request import SalesGraphQuerySchema, SalesPostSchema, SalesSchema, SalseResponseSchema
+
+ORDER_COUNT = 20000
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans are checked on PostgreSQL only")
+class OrderQueryPlanTest(QueryPlanTestMixin, TestCase):
+    """
+    `GET sales` and `sales/graph` queries should be served by an index, never by a sequential scan
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cars = Car.objects.bulk_create([
+            Car(name=f"Car {index}", version=1, price=100000 + index, fuel_type="petrol", milage=10,
+                engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+            for index in range(50)
+        ])
+        users = User.objects.bulk_create([User(username=f"user_{index}", email=f"user_{index}@example.com")
+                                          for index in range(50)])
+        cls.start = timezone.now() - timedelta(days=730)
+        Order.objects.bulk_create([
+            Order(car=cars[index % len(cars)],
+                  customer=users[index % len(users)],
+                  payment_method=("upi", "cash", "netbanking")[index % 3],
+                  payment_status="failed" if index % 100 == 0 else ("complete", "pending")[index % 2],
+                  order_date=cls.start + timedelta(minutes=index * 50))
+            for index in range(ORDER_COUNT)
+        ], batch_size=2000)
+        cls.analyze(Car._meta.db_table, User._meta.db_table, Order._meta.db_table)
+
+    def page(self, **query_filter):
+        """
+        page queryset exactly as `GET sales` builds it
+        """
+        _, orders = filter_orders(SalesSchema(**query_filter))
+        return ResponseSchema().page_queryset(schema_model=SalseResponseSchema,
+                                              data=orders,
+                                              list_options=ListOptionsSchema())
+
+    def test_payment_status_filter(self):
+        self.assertNoSeqScan(self.page(payment_status="Failed"), Order._meta.db_table)
+
+    def test_payment_method_order_date_filter(self):
+        order_date = self.start + timedelta(minutes=300 * 50)
+        self.assertNoSeqScan(self.page(payment_method="UPI", order_date=order_date), Order._meta.db_table)
+
+    def test_order_date_filter(self):
+        self.assertNoSeqScan(self.page(order_date=self.start + timedelta(minutes=50)), Order._meta.db_table)
+
+    def test_sales_graph_month_range(self):
+        start = (self.start + timedelta(days=30)).date()
+        self.assertNoSeqScan(monthly_order_counts(start, start + timedelta(days=29)), Order._meta.db_table)
+
+
+class OrderSerializationTest(TestCase):
+    """
+    `fields=` projections, NDJSON streaming and the columnar layout of `GET sales`
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cars = Car.objects.bulk_create([
+            Car(name=f"Car {index}", version=1, price=100000 + index, fuel_type="petrol", milage=10,
+                engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+            for index in range(2)
+        ])
+        user = User.objects.create(username="customer", email="customer@example.com")
+        Order.objects.bulk_create([
+            Order(car=cars[index % len(cars)],
+                  customer=user if index % 3 else None,
+                  payment_method="upi",
+                  payment_status="complete",
+                  order_date=timezone.now() - timedelta(days=index))
+            for index in range(4)
+        ])
+
+    def page(self, **options)-> tuple:
+        """
+        `(response, rows)` of one `GET sales` page
+        """
+        response = ResponseSchema()
+        _, orders = filter_orders(SalesSchema())
+        data: list = async_to_sync(response.paginated_data)(schema_model=SalseResponseSchema,
+                                                            data=orders,
+                                                            list_options=ListOptionsSchema(**options))
+        return response, data
+
+    def page_sql(self, fields: str)-> str:
+        _, orders = filter_orders(SalesSchema())
+        return str(ResponseSchema().page_queryset(schema_model=SalseResponseSchema,
+                                                  data=orders,
+                                                  list_options=ListOptionsSchema(fields=fields)).query)
+
+    def stream(self, fields: str = None)-> list:
+        """
+        decoded NDJSON lines of `GET sales`
+        """
+        response = ResponseSchema().stream_ndjson(schema_model=SalseResponseSchema,
+                                                  data=Order.objects.order_by("pk"),
+                                                  fields=fields)
+
+        async def collect()-> list:
+            return [chunk async for chunk in response.streaming_content]
+
+        return [json.loads(line) for line in async_to_sync(collect)()]
+
+    def test_fields_selects_only_those_columns(self):
+        _, data = self.page(fields="id,payment_status")
+        self.assertEqual(len(data), 4)
+        for row in data:
+            self.assertEqual(set(row), {"id", "payment_status"})
+        sql: str = self.page_sql("id,payment_status")
+        self.assertNotIn("order_date", sql)
+        self.assertNotIn("payment_method", sql)
+
+    def test_relation_joined_only_when_requested(self):
+        self.assertIn(Car._meta.db_table, self.page_sql("car"))
+        self.assertNotIn(Car._meta.db_table, self.page_sql("id"))
+        _, data = self.page(fields="car")
+        self.assertEqual({row["car"]["name"] for row in data}, {"Car 0", "Car 1"})
+
+    def test_unknown_field(self):
+        response, data = self.page(fields="id,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.error)
+        self.assertEqual(data, [])
+
+    def test_ndjson_fields(self):
+        lines: list = self.stream(fields="id,payment_method")
+        self.assertEqual(len(lines), 4)
+        for line in lines:
+            self.assertEqual(set(line), {"id", "payment_method"})
+
+    def test_ndjson_unknown_field(self):
+        response = ResponseSchema().stream_ndjson(schema_model=SalseResponseSchema,
+                                                  data=Order.objects.order_by("pk"),
+                                                  fields="secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.error)
+
+    def test_columnar_matches_rows(self):
+        _, rows = self.page()
+        response, data = self.page(format="columnar")
+        self.assertEqual(data, [])
+        # Every related object is sent once, four orders share two cars and one customer
+        self.assertEqual(len(response.related["car"]), 2)
+        self.assertEqual(len(response.related["customer"]), 1)
+        rebuilt: list = []
+        for position in range(len(response.columns["id"])):
+            row: dict = {name: values[position] for (name, values) in response.columns.items()}
+            for name in ("car", "customer"):
+                row[name] = response.related[name].get(row[name])
+            rebuilt.append(row)
+        self.assertEqual(rebuilt, rows)
+
+    def test_empty_update_payload(self):
+        response = ResponseSchema()
+        data: list = async_to_sync(response.updated_data)(schema_model=SalseResponseSchema,
+                                                          data=Order.objects.all(),
+                                                          values={})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("payload", response.error)
+        self.assertEqual(data, [])
+
+
+class SalesGraphTest(TestCase):
+    """
+    `sales/graph` monthly buckets and labels
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cars = Car.objects.bulk_create([
+            Car(name=f"Car {index}", version=1, price=100000 + index, fuel_type="petrol", milage=10,
+                engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+            for index in range(2)
+        ])
+        order_dates: list = [
+            (cls.cars[0], datetime(2024, 12, 1)),
+            (cls.cars[0], datetime(2024, 12, 31, 23, 59)),
+            (cls.cars[1], datetime(2024, 12, 15)),
+            (cls.cars[0], datetime(2025, 1, 1)),
+            (cls.cars[1], datetime(2025, 2, 28, 12)),
+            (cls.cars[1], datetime(2025, 3, 1)),
+        ]
+        Order.objects.bulk_create([
+            Order(car=car, payment_method="upi", payment_status="complete",
+                  order_date=timezone.make_aware(order_date))
+            for (car, order_date) in order_dates
+        ])
+
+    def graph(self, **query)-> ResponseSchema:
+        return async_to_sync(get_graph_data)(None, SalesGraphQuerySchema(**query))
+
+    def test_range_across_years(self):
+        response: ResponseSchema = self.graph(**{"from": date(2024, 12, 1), "to": date(2025, 2, 28)})
+        self.assertEqual(response.data, [
+            {"label": "Car 0", "data": [{"December 2024": 2}, {"January 2025": 1}, {"February 2025": 0}]},
+            {"label": "Car 1", "data": [{"December 2024": 1}, {"January 2025": 0}, {"February 2025": 1}]},
+        ])
+
+    def test_single_year_labels(self):
+        response: ResponseSchema = self.graph(year=2024)
+        self.assertEqual(len(response.data[0]["data"]), 12)
+        self.assertEqual(response.data[0]["data"][-1], {"December": 2})
+        self.assertEqual(response.data[1]["data"][-1], {"December": 1})
+        self.assertEqual(sum(count for month in response.data[0]["data"] for count in month.values()), 2)
+
+    def test_last_year(self):
+        response: ResponseSchema = self.graph(year=9999)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["data"][-1], {"December": 0})
+
+    def test_range_too_long(self):
+        response: ResponseSchema = self.graph(**{"from": date(2000, 1, 1), "to": date(2010, 1, 1)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("to", response.error)
+        self.assertEqual(response.data, [])
+
+
+class OrderBatchTest(TestCase):
+    """
+    `POST sales/batch` validates every order before inserting any
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cars = Car.objects.bulk_create([
+            Car(name=f"Car {index}", version=1, price=100000 + index, fuel_type="petrol", milage=10,
+                engine="1.0L", transmission="Manual", seat=5, color="blue", rate=1, power=50)
+            for index in range(2)
+        ])
+        cls.user = User.objects.create(username="customer", email="customer@example.com")
+
+    def add_batch(self, orders: list)-> ResponseSchema:
+        payload: list = [SalesPostSchema(payment_method="UPI", payment_status="Pending", **order) for order in orders]
+        return async_to_sync(add_order_batch)(None, payload)
+
+    def test_batch_inserted_in_three_queries(self):
+        orders: list = [{"car": self.cars[index % 2].pk, "customer": self.user.pk} for index in range(10)]
+        # car in_bulk, customer in_bulk, one bulk insert
+        with self.assertNumQueries(3):
+            response: ResponseSchema = self.add_batch(orders)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[1]["car"]["name"], "Car 1")
+        self.assertEqual(Order.objects.count(), 10)
+
+    def test_invalid_order_keeps_whole_batch_out(self):
+        orders: list = [{"car": self.cars[0].pk, "customer": self.user.pk},
+                        {"car": 0, "customer": self.user.pk},
+                        {"car": self.cars[1].pk, "customer": 0}]
+        with self.assertNumQueries(2):
+            response: ResponseSchema = self.add_batch(orders)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.error, {"1": {"car": "car not find with given id"},
+                                          "2": {"user": "user not find with given id"}})
+        self.assertEqual(Order.objects.count(), 0)
@@ -1,50 +1,121 @@
+from django.http import HttpResponse
 from ninja import Router, Query, Body
 
 from utils import AuthBearer
-from car_shop.response import ResponseSchema
-from shop.models import Shop, Country, City, State
-from shop.request import ShopPostSchema, ShopResponseSchema, ShopSchema
+from car_shop.response import ResponseSchema, accepts, if_none_match, avalidators, set_validators, not_modified, \
+    NDJSON_MEDIA_TYPE
+from car_shop.request import ListOptionsSchema
+from car_shop.cache import response_cache
+from car_shop.serializers import get_serializer
+from shop.models import Shop, Country, State, City
+from shop.cache import geo_tree, GeoSnapshot, GeoValidationError
+from shop.request import ShopPostSchema, ShopResponseSchema, ShopSchema, ShopNearbySchema, ShopNearbyResponseSchema
+from shop.spatial import parse_coordinates, shop_index
 
 router = Router(tags=["Shops"], auth=AuthBearer())
+# Compiled at startup, `fields=` is validated against the precomputed field names
+get_serializer(ShopResponseSchema, Shop)
 
 @router.get("shop", response=ResponseSchema)
 async def get_shop_details(request,
-                           query_filter: ShopSchema = Query(...)):
+                           http_response: HttpResponse,
+                           query_filter: ShopSchema = Query(...),
+                           list_options: ListOptionsSchema = Query(...)):
     """
     **DB query to get shop`s details based on query filter**
+    - results are keyset paginated, pass `next_cursor` as `cursor` to get the next page
+    - send `Accept: application/x-ndjson` to stream every matching row instead of one page
+    - pages are cached until a `Shop`, `Country`, `State` or `City` changes
+    - `ETag` / `Last-Modified` come from one aggregate query, a matching `If-None-Match` gets an empty `304`
     """
     response = ResponseSchema()
-    shop = Shop.objects.filter(**query_filter.clean_null()).all().select_related("country", "state", "city")
-    data: list = await response.dict_data(schema_model = ShopResponseSchema,
-                                          data = shop)
+    clean_filter: dict = query_filter.clean_null()
+    shop = Shop.objects.filter(**clean_filter).all().select_related("country", "state", "city")
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return response.stream_ndjson(schema_model = ShopResponseSchema,
+                                      data = shop.order_by("pk"),
+                                      fields = list_options.fields)
+    cache_key: str = await response_cache.key("shop", (Shop, Country, State, City), query_filter = clean_filter, list_options = list_options.dict())
+    cached: dict = await response_cache.aget(cache_key)
+    if cached is None:
+        # Country / State / City have no timestamps, the geography tree ETag covers their names
+        geo: GeoSnapshot = await geo_tree.aload()
+        validators: dict = await avalidators(shop, query_filter = clean_filter, list_options = list_options.dict(), geo = geo.etag)
+    else:
+        validators: dict = cached["validators"]
+    if if_none_match(request, validators["ETag"]):
+        return not_modified(request, validators)
+    set_validators(http_response, validators)
+    if cached is not None:
+        return cached["response"]
+    data: list = await response.paginated_data(schema_model = ShopResponseSchema,
+                                               data = shop,
+                                               list_options = list_options)
     response.data.extend(data)
+    await response_cache.aset(cache_key, response, validators)
     return response
 
+@router.get("shop/nearby", response=ResponseSchema)
+async def get_nearby_shops(request,
+                           query: ShopNearbySchema = Query(...)):
+    """
+    **Nearest shops around a point**
+    - k-nearest / radius search runs on the in-memory spatial index, then one DB query reads the shops
+    - `distance` is the great-circle distance in km, closest shop first
+    - shops whose `coordinates` can not be parsed are not indexed
+    """
+    response = ResponseSchema()
+    nearest: list = await shop_index.nearest(latitude = query.lat,
+                                             longitude = query.lon,
+                                             k = query.k,
+                                             radius = query.radius)
+    distances: dict = dict(nearest)
+    data: list = await response.dict_data(schema_model = ShopNearbyResponseSchema,
+                                          data = Shop.objects.filter(pk__in = distances))
+    for item in data:
+        item["distance"] = round(distances[item["id"]], 3)
+    data.sort(key = lambda item: item["distance"])
+    response.data.extend(data)
+    return response
+
+@router.get("geo", response=ResponseSchema)
+async def get_geography(request):
+    """
+    **Country -> State -> City tree served from memory**
+    - the body is encoded once per tree load and sent with an `ETag`
+    - send the `ETag` back in `If-None-Match` to get an empty `304 Not Modified`
+    """
+    geo: GeoSnapshot = await geo_tree.aload()
+    # The tree body is always JSON, whatever renderer `Accept` would pick
+    request.response_media_type = "application/json"
+    if if_none_match(request, geo.etag):
+        return not_modified(request, {"ETag": geo.etag})
+    return set_validators(HttpResponse(geo.body, content_type="application/json"), {"ETag": geo.etag})
+
 @router.post("shop", response=ResponseSchema)
 async def add_shop_details(request,
                            payload: ShopPostSchema = Body(...)):
     """
     **DB query to add new shop`s details**
+    - country / state / city are checked against the in-memory geography tree, no DB lookups
     """
     response = ResponseSchema()
     try:
-        payload.country : Country = await Country.objects.aget(id = payload.country)
-    except Country.DoesNotExist:
-        response.error.update({"country": "country not find with given id"})
-        return response
-    
-    try:
-        payload.state : State = await State.objects.aget(id = payload.state)
-    except State.DoesNotExist:
-        response.error.update({"state": "state not find with given id"})
+        geo: dict = await geo_tree.resolve(country = payload.country,
+                                           state = payload.state,
+                                           city = payload.city)
+    except GeoValidationError as e:
+        response.status_code = 400
+        response.error.update({e.field: e.message})
         return response
-    
-    try:
-        payload.city : City = await City.objects.aget(id = payload.city)
-    except City.DoesNotExist:
-        response.error.update({"city": "city not find with given id"})
+    if parse_coordinates(payload.coordinates) == (None, None):
+        response.status_code = 400
+        response.error.update({"coordinates": "coordinates must be `[longitude, latitude]`"})
         return response
-    shop = Shop(**payload.dict())
+    shop = Shop(**payload.dict(exclude = {"country", "state", "city"}),
+                country_id = geo["country"],
+                state_id = geo["state"],
+                city_id = geo["city"])
     await shop.asave()
     response.status_code = 201
     response.description = "Shop details successfully added"
@@ -59,36 +130,41 @@ async def update_shop_details(request,
                               payload: ShopSchema = Body(...)):
     """
     **DB query to update shop`s details based on query filter**
+    - `city` is required to move shops, `state` and `country` are derived from it when left out
     """
     response = ResponseSchema()
     shop = Shop.objects.filter(**query_filter.clean_null()).all()
     clean_payload: dict = payload.clean_null()
-    try:
-        if "country" in clean_payload:
-            clean_payload["country"] : Country = await Country.objects.aget(id = clean_payload["country"])
-    except Country.DoesNotExist:
-        response.error.update({"country": "country not find with given id"})
+    geo_fields: dict = {field: clean_payload.pop(field) for field in ("country", "state", "city") if field in clean_payload}
+    if geo_fields and "city" not in geo_fields:
+        response.status_code = 400
+        response.error.update({"city": "city is required to change state or country"})
         return response
+    if geo_fields:
+        try:
+            clean_payload.update(await geo_tree.resolve(**geo_fields))
+        except GeoValidationError as e:
+            response.status_code = 400
+            response.error.update({e.field: e.message})
+            return response
     
-    try:
-        if "state" in clean_payload:
-            clean_payload["state"] : State = await State.objects.aget(id = clean_payload["state"])
-    except State.DoesNotExist:
-        response.error.update({"state": "state not find with given id"})
-        return response
+    if "coordinates" in clean_payload:
+        latitude, longitude = parse_coordinates(clean_payload["coordinates"])
+        if latitude is None:
+            response.status_code = 400
+            response.error.update({"coordinates": "coordinates must be `[longitude, latitude]`"})
+            return response
+        clean_payload.update({"latitude": latitude, "longitude": longitude})
     
-    try:
-        if "city" in clean_payload:
-            clean_payload["city"] : City = await City.objects.aget(id = clean_payload["city"])
-    except City.DoesNotExist:
-        response.error.update({"city": "city not find with given id"})
-        return response
-    
-    count: int = await shop.aupdate(**clean_payload)
-    data: list = await response.dict_data(schema_model = ShopResponseSchema,
-                                    data = Shop.objects.filter(**query_filter.clean_null()).all().select_related("country", "state", "city"))
+    data: list = await response.updated_data(schema_model = ShopResponseSchema,
+                                             data = shop,
+                                             values = clean_payload)
+    # set-based update, no post_save signal to rebuild the spatial index or drop cached responses
+    await response_cache.abump(Shop)
+    if "coordinates" in clean_payload:
+        shop_index.invalidate()
     response.data.extend(data)
-    response.description = f'Total {count} shop`s details updated'
+    response.description = f'Total {len(data)} shop`s details updated'
     return response
 
 @router.delete("shop", response=ResponseSchema)
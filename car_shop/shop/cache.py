@@ -0,0 +1,205 @@
+from django.db import transaction
+
+from asgiref.sync import sync_to_async
+from hashlib import blake2b
+from threading import Lock
+
+from car_shop.response import ResponseSchema
+from shop.models import Country, State, City
+
+
+class GstRateTable:
+    """
+    In-process GST rate table (state name -> country + state gst charges)
+    - loaded lazily in one query, served from memory afterwards
+    - invalidated by `Country` / `State` save and delete signals
+    """
+
+    def __init__(self):
+        self._rates: list = None
+        self._generation: int = 0
+        self._lock = Lock()
+
+    def invalidate(self, **kwargs)-> None:
+        """
+        drop loaded rates, next read reloads them from DB
+        """
+        with self._lock:
+            self._generation += 1
+            self._rates = None
+
+    def invalidate_on_commit(self, using: str = None, **kwargs)-> None:
+        """
+        signal receiver, `invalidate` after the `Country` / `State` write commits
+        """
+        transaction.on_commit(self.invalidate, using=using)
+
+    def load(self)-> list:
+        """
+        load rates from DB unless already loaded
+        """
+        rates = self._rates
+        if rates is not None:
+            return rates
+        generation = self._generation
+        rows = State.objects.values_list("name", "gst_chrages", "country__gst_chrages") \
+                            .order_by("country_id", "id")
+        rates = [{name: state_gst + country_gst} for (name, state_gst, country_gst) in rows]
+        with self._lock:
+            # Skip caching when an invalidation happened while rows were loading
+            if generation == self._generation:
+                self._rates = rates
+        return rates
+
+    async def aload(self)-> list:
+        """
+        async version of `load`, no DB round trip when the table is warm
+        """
+        if self._rates is not None:
+            return self._rates
+        return await sync_to_async(self.load)()
+
+
+gst_rate_table = GstRateTable()
+
+
+class GeoValidationError(Exception):
+    """
+    Country / State / City triple does not match the geography tree
+    """
+
+    def __init__(self, field: str, message: str):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+class GeoSnapshot:
+    """
+    One loaded copy of the Country -> State -> City tree
+    - `state_country`, `city_state`: child id -> parent id
+    - `body`: `GET geo` response body, encoded once per load
+    - `etag`: strong ETag of `body`
+    """
+
+    def __init__(self,
+                 countries: set,
+                 state_country: dict,
+                 city_state: dict,
+                 body: bytes):
+        self.countries = countries
+        self.state_country = state_country
+        self.city_state = city_state
+        self.body = body
+        self.etag = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+
+
+class GeoTree:
+    """
+    In-process Country -> State -> City tree
+    - loaded lazily in three queries, served from memory afterwards
+    - validates shop FK triples with dict lookups, no DB access
+    - invalidated by `Country` / `State` / `City` save and delete signals
+    """
+
+    def __init__(self):
+        self._snapshot: GeoSnapshot = None
+        self._generation: int = 0
+        self._lock = Lock()
+
+    def invalidate(self, **kwargs)-> None:
+        """
+        drop the loaded tree, next read reloads it from DB
+        """
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def invalidate_on_commit(self, using: str = None, **kwargs)-> None:
+        """
+        signal receiver, `invalidate` after the geo write commits
+        """
+        transaction.on_commit(self.invalidate, using=using)
+
+    def load(self)-> GeoSnapshot:
+        """
+        load the tree from DB unless already loaded
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        generation = self._generation
+        countries: dict = {}
+        states: dict = {}
+        state_country: dict = {}
+        city_state: dict = {}
+        for row in Country.objects.values("id", "name", "gst_chrages").order_by("id"):
+            countries[row["id"]] = {**row, "states": []}
+        # The three queries share no snapshot, a child whose parent was committed after the parent
+        # query is skipped, its commit also bumped the generation so this tree is not cached
+        for row in State.objects.values("id", "name", "gst_chrages", "country_id").order_by("id"):
+            country_id = row.pop("country_id")
+            if country_id not in countries:
+                continue
+            state_country[row["id"]] = country_id
+            states[row["id"]] = {**row, "cities": []}
+            countries[country_id]["states"].append(states[row["id"]])
+        for row in City.objects.values("id", "name", "state_id").order_by("id"):
+            state_id = row.pop("state_id")
+            if state_id not in states:
+                continue
+            city_state[row["id"]] = state_id
+            states[state_id]["cities"].append(row)
+        body: bytes = ResponseSchema(data=list(countries.values())).json().encode()
+        snapshot = GeoSnapshot(countries=set(countries),
+                               state_country=state_country,
+                               city_state=city_state,
+                               body=body)
+        with self._lock:
+            # Skip caching when an invalidation happened while rows were loading
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    async def aload(self)-> GeoSnapshot:
+        """
+        async version of `load`, no DB round trip when the tree is warm
+        """
+        if self._snapshot is not None:
+            return self._snapshot
+        return await sync_to_async(self.load)()
+
+    async def resolve(self,
+                      country: int = None,
+                      state: int = None,
+                      city: int = None)-> dict:
+        """
+        validate a (country, state, city) id triple and fill in missing parents
+        - parents left out are derived from the city / state
+        - returns `{"country": id, "state": id, "city": id}` with only the resolvable keys
+        - raises `GeoValidationError` for unknown ids or a child outside its parent
+        """
+        snapshot: GeoSnapshot = await self.aload()
+        resolved: dict = {}
+        if city is not None:
+            if city not in snapshot.city_state:
+                raise GeoValidationError("city", "city not find with given id")
+            if state is not None and snapshot.city_state[city] != state:
+                raise GeoValidationError("city", "city does not belong to the given state")
+            resolved["city"] = city
+            state = snapshot.city_state[city]
+        if state is not None:
+            if state not in snapshot.state_country:
+                raise GeoValidationError("state", "state not find with given id")
+            if country is not None and snapshot.state_country[state] != country:
+                raise GeoValidationError("state", "state does not belong to the given country")
+            resolved["state"] = state
+            country = snapshot.state_country[state]
+        if country is not None:
+            if country not in snapshot.countries:
+                raise GeoValidationError("country", "country not find with given id")
+            resolved["country"] = country
+        return resolved
+
+
+geo_tree = GeoTree()
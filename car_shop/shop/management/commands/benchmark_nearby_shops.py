@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+import random
+import time
+
+from shop.spatial import KDTree, km_to_chord2, to_unit_vector
+
+
+class Command(BaseCommand):
+    help = "Time k-nearest and radius queries of the shop spatial index against a linear scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=1_000)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--radius", type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        shops: int = options["shops"]
+        queries: int = options["queries"]
+        k: int = options["k"]
+        max_chord2: float = km_to_chord2(options["radius"])
+        rng = random.Random(0)
+        items: list = [(pk, to_unit_vector(rng.uniform(-60, 70), rng.uniform(-180, 180))) for pk in range(shops)]
+        targets: list = [to_unit_vector(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(queries)]
+
+        start = time.perf_counter()
+        tree = KDTree(list(items))
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for target in targets:
+            tree.nearest(target, k)
+        nearest = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for target in targets:
+            tree.nearest(target, shops, max_chord2)
+        radius = time.perf_counter() - start
+
+        scan_targets: list = targets[:max(1, queries // 100)]
+        start = time.perf_counter()
+        for target in scan_targets:
+            sorted(items, key=lambda item: sum((a - b) ** 2 for a, b in zip(target, item[1])))[:k]
+        scan = (time.perf_counter() - start) / len(scan_targets)
+
+        self.stdout.write(f"shops: {shops}, queries: {queries}")
+        self.stdout.write(f"build: {build * 1000:,.0f} ms")
+        self.stdout.write(f"k-nearest (k={k}): {nearest / queries * 1000:.3f} ms/query")
+        self.stdout.write(f"radius ({options['radius']} km): {radius / queries * 1000:.3f} ms/query")
+        self.stdout.write(f"linear scan: {scan * 1000:.3f} ms/query")
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import re
+
+# Frozen copy of `shop.spatial.parse_coordinates`, migrations must not import app code
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def parse_coordinates(value: str)-> tuple:
+    """
+    `[longitude, latitude]` to `(latitude, longitude)`, `(None, None)` when out of bounds or not two numbers
+    """
+    numbers: list = NUMBER_PATTERN.findall(value or "")
+    if len(numbers) != 2:
+        return None, None
+    longitude, latitude = float(numbers[0]), float(numbers[1])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return latitude, longitude
+
+
+def parse_shop_coordinates(apps, schema_editor):
+    """
+    fill `latitude` / `longitude` from the free-form `coordinates` of existing shops
+    """
+    Shop = apps.get_model("shop", "Shop")
+    shops: list = []
+    for shop in Shop.objects.only("id", "coordinates").iterator(chunk_size=2000):
+        shop.latitude, shop.longitude = parse_coordinates(shop.coordinates)
+        shops.append(shop)
+        if len(shops) >= 2000:
+            Shop.objects.bulk_update(shops, ["latitude", "longitude"])
+            shops = []
+    Shop.objects.bulk_update(shops, ["latitude", "longitude"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_country_gst_chrages_state_gst_chrages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(parse_shop_coordinates, migrations.RunPython.noop),
+    ]
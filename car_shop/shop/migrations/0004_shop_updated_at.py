@@ -0,0 +1,20 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_shop_latitude_shop_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -42,6 +42,10 @@ class Shop(models.Model):
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="shop_city")
     markerOffset = models.FloatField(blank=False, null=False)
     coordinates = models.CharField(blank=False, null=False)
+    # parsed from `coordinates` on save, see `shop.signals.sync_shop_location`
+    latitude = models.FloatField(blank=True, null=True, editable=False)
+    longitude = models.FloatField(blank=True, null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.name}'
\ No newline at end of file
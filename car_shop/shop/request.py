@@ -1,4 +1,5 @@
 from ninja import Schema, ModelSchema
+from pydantic import Field
 
 from car_shop.request import BaseQueryFilter
 from shop.models import Country, State, City, Shop
@@ -37,15 +38,17 @@ class ShopResponseSchema(ModelSchema, BaseQueryFilter):
     city: CitySchema = None
     class Config:
         model = Shop
-        model_fields = ["id", "name", "markerOffset", "coordinates"]
+        model_fields = ["id", "name", "markerOffset", "coordinates", "latitude", "longitude", "updated_at"]
 
 class ShopPostSchema(ModelSchema):
     """
     Shop Post schema for request body
+    - `country` and `state` can be left out, they are derived from `city`
     """
     class Config:
         model = Shop
         model_fields = ["name", "country", "state", "city", "markerOffset", "coordinates"]
+        model_fields_optional = ["country", "state"]
 
 class ShopSchema(ModelSchema, BaseQueryFilter):
     """
@@ -54,4 +57,22 @@ class ShopSchema(ModelSchema, BaseQueryFilter):
     class Config:
         model = Shop
         model_fields = ["id", "name", "country", "state", "city", "markerOffset", "coordinates"]
-        model_fields_optional = ["id", "name", "country", "state", "city", "markerOffset", "coordinates"]
\ No newline at end of file
+        model_fields_optional = ["id", "name", "country", "state", "city", "markerOffset", "coordinates"]
+
+class ShopNearbySchema(Schema):
+    """
+    Nearest shops query
+    - `lat`, `lon`: point to search around
+    - `k`: maximum number of shops to return
+    - `radius`: optional search radius in km
+    """
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    k: int = Field(10, ge=1, le=1000)
+    radius: float = Field(None, gt=0)
+
+class ShopNearbyResponseSchema(ShopResponseSchema):
+    """
+    Shop Response Schema with distance from the query point
+    """
+    distance: float = None
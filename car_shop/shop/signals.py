@@ -0,0 +1,32 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from car_shop.cache import response_cache
+from shop.models import Country, State, City, Shop
+from shop.cache import gst_rate_table, geo_tree
+from shop.spatial import parse_coordinates, shop_index
+
+
+def sync_shop_location(sender, instance: Shop, **kwargs)-> None:
+    """
+    keep `latitude` / `longitude` in step with `coordinates`
+    """
+    instance.latitude, instance.longitude = parse_coordinates(instance.coordinates)
+
+
+
+def connect_signals()-> None:
+    """
+    connect shop cache invalidation receivers
+    """
+    for model in (Country, State):
+        post_save.connect(gst_rate_table.invalidate_on_commit, sender=model, dispatch_uid=f"gst_rate_table_save_{model.__name__}")
+        post_delete.connect(gst_rate_table.invalidate_on_commit, sender=model, dispatch_uid=f"gst_rate_table_delete_{model.__name__}")
+    for model in (Country, State, City):
+        post_save.connect(geo_tree.invalidate_on_commit, sender=model, dispatch_uid=f"geo_tree_save_{model.__name__}")
+        post_delete.connect(geo_tree.invalidate_on_commit, sender=model, dispatch_uid=f"geo_tree_delete_{model.__name__}")
+    pre_save.connect(sync_shop_location, sender=Shop, dispatch_uid="shop_location_sync")
+    post_save.connect(shop_index.invalidate_on_commit, sender=Shop, dispatch_uid="shop_index_save")
+    post_delete.connect(shop_index.invalidate_on_commit, sender=Shop, dispatch_uid="shop_index_delete")
+    for model in (Country, State, City, Shop):
+        post_save.connect(response_cache.invalidate, sender=model, dispatch_uid=f"response_cache_save_{model.__name__}")
+        post_delete.connect(response_cache.invalidate, sender=model, dispatch_uid=f"response_cache_delete_{model.__name__}")
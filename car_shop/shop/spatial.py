@@ -0,0 +1,195 @@
+from django.db import transaction
+
+from asgiref.sync import sync_to_async
+from heapq import heappush, heappushpop
+from math import asin, cos, radians, sin
+from threading import Lock
+
+import re
+
+from shop.models import Shop
+
+EARTH_RADIUS_KM = 6371.0088
+
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def parse_coordinates(value: str)-> tuple:
+    """
+    parse `Shop.coordinates` to `(latitude, longitude)`
+    - the frontend (react-simple-maps) stores markers as `[longitude, latitude]`
+    - returns `(None, None)` when the value is not two numbers inside lon / lat bounds
+    """
+    numbers: list = NUMBER_PATTERN.findall(value or "")
+    if len(numbers) != 2:
+        return None, None
+    longitude, latitude = float(numbers[0]), float(numbers[1])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return latitude, longitude
+
+
+def to_unit_vector(latitude: float,
+                   longitude: float)-> tuple:
+    """
+    point on the unit sphere, chord length between points grows with great-circle distance
+    """
+    lat, lon = radians(latitude), radians(longitude)
+    return (cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat))
+
+
+def km_to_chord2(distance: float)-> float:
+    """
+    squared chord length on the unit sphere for a great-circle distance in km
+    """
+    angle: float = min(distance / EARTH_RADIUS_KM, 3.141592653589793)
+    return (2 * sin(angle / 2)) ** 2
+
+
+def chord2_to_km(chord2: float)-> float:
+    """
+    great-circle distance in km for a squared chord length on the unit sphere
+    """
+    return 2 * EARTH_RADIUS_KM * asin(min(chord2 ** 0.5 / 2, 1.0))
+
+
+class KDTree:
+    """
+    Static 3-d tree over unit sphere vectors
+    - nodes live in flat lists, `left` / `right` hold child positions (-1 for none)
+    - built once in O(n log^2 n), queried in O(log n) for small k
+    """
+
+    def __init__(self, items: list):
+        # items: list of (pk, (x, y, z))
+        self.ids: list = []
+        self.points: list = []
+        self.left: list = []
+        self.right: list = []
+        self.root: int = self._build(items, 0)
+
+    def __len__(self)-> int:
+        return len(self.ids)
+
+    def _build(self,
+               items: list,
+               depth: int)-> int:
+        if not items:
+            return -1
+        axis: int = depth % 3
+        items.sort(key=lambda item: item[1][axis])
+        median: int = len(items) // 2
+        node: int = len(self.ids)
+        self.ids.append(items[median][0])
+        self.points.append(items[median][1])
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build(items[:median], depth + 1)
+        self.right[node] = self._build(items[median + 1:], depth + 1)
+        return node
+
+    def nearest(self,
+                target: tuple,
+                k: int,
+                max_chord2: float = 4.0)-> list:
+        """
+        up to `k` nearest `(pk, squared chord)` pairs within `max_chord2`, closest first
+        """
+        heap: list = []
+        self._nearest(self.root, 0, target, k, max_chord2, heap)
+        return sorted(((pk, -negative) for (negative, pk) in heap), key=lambda item: item[1])
+
+    def _nearest(self,
+                 node: int,
+                 depth: int,
+                 target: tuple,
+                 k: int,
+                 bound: float,
+                 heap: list)-> float:
+        if node == -1:
+            return bound
+        point: tuple = self.points[node]
+        dx, dy, dz = target[0] - point[0], target[1] - point[1], target[2] - point[2]
+        chord2: float = dx * dx + dy * dy + dz * dz
+        if chord2 <= bound:
+            if len(heap) < k:
+                heappush(heap, (-chord2, self.ids[node]))
+            else:
+                heappushpop(heap, (-chord2, self.ids[node]))
+            if len(heap) == k:
+                bound = min(bound, -heap[0][0])
+        diff: float = target[depth % 3] - point[depth % 3]
+        near, far = (self.left[node], self.right[node]) if diff < 0 else (self.right[node], self.left[node])
+        bound = self._nearest(near, depth + 1, target, k, bound, heap)
+        if diff * diff <= bound:
+            bound = self._nearest(far, depth + 1, target, k, bound, heap)
+        return bound
+
+
+class ShopSpatialIndex:
+    """
+    In-process spatial index of shop locations
+    - loaded lazily in one query, served from memory afterwards
+    - invalidated by `Shop` save and delete signals, rebuilt on the next read
+    """
+
+    def __init__(self):
+        self._tree: KDTree = None
+        self._generation: int = 0
+        self._lock = Lock()
+
+    def invalidate(self, **kwargs)-> None:
+        """
+        drop the loaded tree, next read rebuilds it from DB
+        """
+        with self._lock:
+            self._generation += 1
+            self._tree = None
+
+    def invalidate_on_commit(self, using: str = None, **kwargs)-> None:
+        """
+        signal receiver, `invalidate` after the shop write commits
+        """
+        transaction.on_commit(self.invalidate, using=using)
+
+    def load(self)-> KDTree:
+        """
+        build the tree from DB unless already built
+        """
+        tree = self._tree
+        if tree is not None:
+            return tree
+        generation = self._generation
+        rows = Shop.objects.filter(latitude__isnull=False, longitude__isnull=False) \
+                           .values_list("id", "latitude", "longitude")
+        tree = KDTree([(pk, to_unit_vector(latitude, longitude)) for (pk, latitude, longitude) in rows])
+        with self._lock:
+            # Skip caching when an invalidation happened while rows were loading
+            if generation == self._generation:
+                self._tree = tree
+        return tree
+
+    async def aload(self)-> KDTree:
+        """
+        async version of `load`, no DB round trip when the tree is warm
+        """
+        if self._tree is not None:
+            return self._tree
+        return await sync_to_async(self.load)()
+
+    async def nearest(self,
+                      latitude: float,
+                      longitude: float,
+                      k: int,
+                      radius: float = None)-> list:
+        """
+        up to `k` nearest `(shop id, distance in km)` pairs, closest first
+        - `radius` (km) drops shops further away
+        """
+        tree: KDTree = await self.aload()
+        max_chord2: float = 4.0 if radius is None else km_to_chord2(radius)
+        return [(pk, chord2_to_km(chord2))
+                for (pk, chord2) in tree.nearest(to_unit_vector(latitude, longitude), k, max_chord2)]
+
+
+shop_index = ShopSpatialIndex()
@@ -1,5 +1,4 @@
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
-from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.encoding import force_bytes, force_str
@@ -23,10 +22,13 @@ import random
 
 from .request import TestDrivePostSChema, TestDriveSchema, UserSignInSchema, UserSchema, UserLoginSchema, \
     UserChangePassword, GoogleSocialAuthSchema, UserUpdateSchema
-from utils import AuthBearer, create_access_token, send_mail
+from utils import AuthBearer, create_access_token, asend_mail, amake_password, acheck_password
 from car_shop.settings import GOOGLE_CLIENT_ID
 from user.models import TestDrive, UserImage
-from car_shop.response import ResponseSchema
+from car_shop.response import ResponseSchema, accepts, NDJSON_MEDIA_TYPE
+from car_shop.images import image_variant_pool, variant_urls
+from car_shop.uploads import ImageValidationError, avalidate_images
+from car_shop.request import ListOptionsSchema
 from car_shop.logger import logger
 
 router = Router(tags=["User"])
@@ -53,13 +55,22 @@ async def add_test_drive_request(request,
 
 @router.get("test_drive", response = ResponseSchema, auth = AuthBearer())
 async def get_test_drive(request,
-                         query_filter: TestDriveSchema = Query(...)):
+                         query_filter: TestDriveSchema = Query(...),
+                         list_options: ListOptionsSchema = Query(...)):
     """
     **DB Query to filter test_drive based on query_filter and Returns records**
+    - results are keyset paginated, pass `next_cursor` as `cursor` to get the next page
+    - send `Accept: application/x-ndjson` to stream every matching row instead of one page
     """
     response: ResponseSchema = ResponseSchema()
-    data = await response.dict_data(schema_model = TestDriveSchema,
-                                    data = TestDrive.objects.filter(**query_filter.clean_null()).all())
+    test_drives = TestDrive.objects.filter(**query_filter.clean_null()).all()
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return response.stream_ndjson(schema_model = TestDriveSchema,
+                                      data = test_drives.order_by("pk"),
+                                      fields = list_options.fields)
+    data = await response.paginated_data(schema_model = TestDriveSchema,
+                                         data = test_drives,
+                                         list_options = list_options)
     response.data.extend(data)
     return response
 
@@ -72,11 +83,11 @@ async def update_test_drive(request,
     """
     response = ResponseSchema()
     test_drive = TestDrive.objects.filter(**query_filter.clean_null()).all()
-    count = await test_drive.aupdate(**payload.dict())
-    data = await response.dict_data(schema_model = TestDriveSchema,
-                                    data = TestDrive.objects.filter(**query_filter.clean_null()).all())
+    data = await response.updated_data(schema_model = TestDriveSchema,
+                                       data = test_drive,
+                                       values = payload.clean_null())
     response.data.extend(data)
-    response.description = f'Total {count} records updated'
+    response.description = f'Total {len(data)} records updated'
     return response
 
 @router.delete("test_drive", response = ResponseSchema, auth = AuthBearer())
@@ -119,12 +130,12 @@ async def create_user_account(request,
     user = User(
         username = payload["username"],
         email = payload["email"],
-        password = make_password(payload["password"]),
+        password = await amake_password(payload["password"]),
         is_active = False
     )
     await user.asave()
     # Sending email to user to verify email
-    mail_status = send_mail(
+    mail_status = await asend_mail(
         subject="Email Verification Link",
         to=[user.email],
         template_message = render_to_string("email_link.html", {
@@ -158,7 +169,7 @@ async def user_login(request,
     response = ResponseSchema()
     user = await User.objects.filter(email = payload.email).afirst()
     if user is not None:
-        if check_password(payload.password, user.password):
+        if await acheck_password(payload.password, user.password):
             if user.is_active:
                 token_payload = {
                     "username": user.username,
@@ -217,7 +228,7 @@ async def chnage_password(request,
     user = await User.objects.filter(email = payload.email).afirst()
     if user is not None:
         if payload.password == payload.conform_password:
-            user.password = make_password(payload.password)
+            user.password = await amake_password(payload.password)
             await user.asave()
             response.description = "password changed"
             return response
@@ -249,7 +260,7 @@ async def google_sign(request,
                 user = User(
                     username = token_info.get("name"),
                     email = token_info.get("email"),
-                    password = make_password(''.join(random.choices(string.ascii_lowercase, k=5)))
+                    password = await amake_password(''.join(random.choices(string.ascii_lowercase, k=5)))
                 )
                 await user.asave()
                 existing_user = user
@@ -289,23 +300,34 @@ async def update_user_details(request,
     **DB query to update user details | avatar based on query email provided**
     """
     response = ResponseSchema()
+    if avatar is not None:
+        try:
+            await avalidate_images(avatar)
+        except ImageValidationError as e:
+            response.status_code = 400
+            response.error.update({"avatar": str(e)})
+            return response
     existing_user = await User.objects.filter(email = email).afirst()
     clean_payload = payload.clean_empty()
     if existing_user is not None:
         if len(clean_payload) != 0:
             if "password" in clean_payload:
-                clean_payload["password"] = make_password(clean_payload["password"])
+                clean_payload["password"] = await amake_password(clean_payload["password"])
             existing_user.__dict__.update(**clean_payload)
             await existing_user.asave()
         if avatar is not None:
             try:
                 user_image = await UserImage.objects.aget(user=existing_user)
                 user_image.avatar = avatar
+                user_image.avatar_rendered = False
                 await user_image.asave()
             except UserImage.DoesNotExist:
                 user_image = UserImage(user=existing_user,
                                        avatar=avatar)
                 await user_image.asave()
+            rendered: list = await image_variant_pool.build(user_image.avatar.name)
+            if rendered:
+                await UserImage.objects.filter(avatar__in = rendered).aupdate(avatar_rendered = True)
         response.description = "User successfully updated"
         return response
     else:
@@ -323,7 +345,10 @@ async def get_user_details(request):
     res_dict = dict()
     try:
         user_image = await UserImage.objects.aget(user=existing_user)
-        res_dict.update({"url": f"{request.get_host()}{user_image.avatar.url}"})
+        res_dict.update({"url": f"{request.get_host()}{user_image.avatar.url}",
+                         "variants": variant_urls(user_image.avatar.name,
+                                                     host=request.get_host(),
+                                                     rendered=user_image.avatar_rendered)})
     except UserImage.DoesNotExist:
         pass
 
@@ -0,0 +1,64 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from ninja.errors import HttpError
+
+import asyncio
+import time
+
+from utils import PasswordHasherPool
+
+
+class Command(BaseCommand):
+    help = "Measure event loop latency seen by a cheap request (like a product list) during a login storm"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--queue-limit", type=int, default=64)
+
+    def handle(self, *args, **options):
+        inline = asyncio.run(self.storm(options["logins"], hasher=None))
+        pool = asyncio.run(self.storm(options["logins"],
+                                      hasher=PasswordHasherPool(max_workers=options["workers"],
+                                                                queue_limit=options["queue_limit"])))
+        for label, (latencies, elapsed, rejected) in (("inline hashing", inline), ("hasher pool", pool)):
+            latencies.sort()
+            self.stdout.write(f"{label}: storm {elapsed:.2f}s, rejected {rejected}, "
+                              f"list latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms "
+                              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms "
+                              f"max {latencies[-1] * 1000:.1f}ms")
+
+    async def storm(self,
+                    logins: int,
+                    hasher: PasswordHasherPool = None)-> tuple:
+        """
+        run `logins` password hashes concurrently while a cheap handler is called every 5ms
+        """
+        latencies: list = []
+        rejected: int = 0
+        done = asyncio.Event()
+
+        async def login(index: int):
+            nonlocal rejected
+            await asyncio.sleep(0)
+            if hasher is None:
+                make_password(f"password-{index}")
+                return
+            try:
+                await hasher.run(make_password, f"password-{index}")
+            except HttpError:
+                rejected += 1
+
+        async def product_list():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                latencies.append(time.perf_counter() - start - 0.005)
+
+        ticker = asyncio.create_task(product_list())
+        start = time.perf_counter()
+        await asyncio.gather(*[login(index) for index in range(logins)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await ticker
+        return latencies, elapsed, rejected
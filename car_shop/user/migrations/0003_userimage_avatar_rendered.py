@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_userimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userimage',
+            name='avatar_rendered',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
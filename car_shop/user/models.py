@@ -11,6 +11,8 @@ class TestDrive(models.Model):
 class UserImage(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     avatar = models.ImageField(blank=True, null=True, upload_to="avatar")
+    # Set once the avatar variants are rendered, reset when the avatar changes
+    avatar_rendered = models.BooleanField(default=False, editable=False)
 
     def __str__(self) -> str:
         return f'{self.avatar}'
\ No newline at end of file
@@ -1,31 +1,127 @@
 import os
 import jwt
+import time
+import queue
+import asyncio
+import hashlib
 import datetime
+from threading import Lock, Thread, BoundedSemaphore
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from ninja.errors import HttpError
 from ninja.security import HttpBearer
 
-from django.core.mail import EmailMessage
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, check_password
+from django.core.mail import EmailMessage, get_connection
 from django.template.loader import render_to_string
 
+from car_shop.logger import logger
+
+@lru_cache(maxsize=None)
+def get_jwt_config()-> dict:
+    """
+    JWT configurations, read from environment once
+    """
+    return {
+        "secret_key": os.environ.get("JWT_SECRET_KEY"),
+        "algorithm": os.environ.get("JWT_ALGORITHM"),
+        "expires": os.environ.get("JWT_EXPIRES"),
+        "refresh_expire": os.environ.get("REFRESH_EXPIRE"),
+    }
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of already verified tokens
+    - keyed by token digest, stores decoded claims until the token `exp`
+    - a hit skips signature verification and claim parsing
+    """
+
+    def __init__(self,
+                 max_size: int = 10000):
+        self.max_size = max_size
+        self._tokens: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def digest(token: str)-> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self,
+            token: str)-> dict:
+        """
+        returns decoded claims of a verified, not yet expired token or None
+        """
+        key = self.digest(token)
+        with self._lock:
+            item = self._tokens.get(key)
+            if item is not None:
+                claims, expires = item
+                if expires > time.time():
+                    self._tokens.move_to_end(key)
+                    self.hits += 1
+                    return dict(claims)
+                del self._tokens[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def set(self,
+            token: str,
+            claims: dict)-> None:
+        """
+        cache decoded claims, tokens without `exp` are never cached
+        """
+        expires = claims.get("exp")
+        if not isinstance(expires, (int, float)):
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._tokens[key] = (dict(claims), expires)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self)-> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._tokens),
+            "max_size": self.max_size,
+        }
+
+token_cache = VerifiedTokenCache(max_size=settings.JWT_TOKEN_CACHE_SIZE)
+
 class AuthBearer(HttpBearer):
     def authenticate(self, request, token):
+        decoded_data = token_cache.get(token)
+        if decoded_data is not None:
+            return decoded_data
+        jwt_config: dict = get_jwt_config()
         try:
             decoded_data = jwt.decode(jwt=token,
-                           key=os.environ.get("JWT_SECRET_KEY"),
-                           algorithms=os.environ.get("JWT_ALGORITHM"))
+                           key=jwt_config["secret_key"],
+                           algorithms=[jwt_config["algorithm"]])
         except jwt.DecodeError:
             raise HttpError(status_code=400, message=f"failed to decode token")
         except jwt.ExpiredSignatureError:
             raise HttpError(status_code=400, message="token expire please try again")
+        token_cache.set(token, decoded_data)
         return decoded_data
 
 def get_token(payload: dict):
     """returns token"""
-    
+    jwt_config: dict = get_jwt_config()
     return jwt.encode(
             payload=payload,
-            key=os.environ.get("JWT_SECRET_KEY"),
-            algorithm=os.environ.get("JWT_ALGORITHM")
+            key=jwt_config["secret_key"],
+            algorithm=jwt_config["algorithm"]
         )
 
 def create_access_token(payload: dict,
@@ -33,18 +129,36 @@ def create_access_token(payload: dict,
     """
     Genetare JWT access token
     """
+    jwt_config: dict = get_jwt_config()
     if type == "access":
         payload["exp"] = datetime.datetime.utcnow() + \
-                            datetime.timedelta(seconds=int(os.environ.get("JWT_EXPIRES")))
+                            datetime.timedelta(seconds=int(jwt_config["expires"]))
         payload["type"] = "access"
         return get_token(payload=payload)
     else:
         payload["type"] = "refresh"
         payload["exp"] = datetime.datetime.utcnow() + \
-                            datetime.timedelta(seconds=int(os.environ.get("JWT_EXPIRES")) + \
-                            int(os.environ.get("REFRESH_EXPIRE")))
+                            datetime.timedelta(seconds=int(jwt_config["expires"]) + \
+                            int(jwt_config["refresh_expire"]))
         return get_token(payload=payload)
     
+def build_mail(subject: str,
+               to: list,
+               cc: list = None,
+               bcc: list = None,
+               template_message: str = None,
+               body_message: str = None)-> EmailMessage:
+    """
+    Build mail message
+    """
+    return EmailMessage(
+        subject=subject,
+        to=to,
+        cc= cc if cc is not None else None,
+        bcc= bcc if bcc is not None else None,
+        body= template_message if template_message is not None else body_message,
+    )
+
 def send_mail(subject: str,
               to: list,
               cc: list = None,
@@ -54,15 +168,151 @@ def send_mail(subject: str,
     """
     Send mail helper functions
     """
-    mail = EmailMessage(
-        subject=subject,
-        to=to,
-        cc= cc if cc is not None else None,
-        bcc= bcc if bcc is not None else None,
-        body= template_message if template_message is not None else body_message,
-    )
+    mail = build_mail(subject=subject,
+                      to=to,
+                      cc=cc,
+                      bcc=bcc,
+                      template_message=template_message,
+                      body_message=body_message)
 
     mail_status: int = mail.send(
         fail_silently=True
     )
-    return mail_status
\ No newline at end of file
+    return mail_status
+
+class MailDispatcher:
+    """
+    Background mail dispatcher
+    - async views hand messages over without blocking the event loop
+    - one worker thread keeps a single SMTP connection open and sends every
+      queued message over it, the connection is closed after `idle_timeout` seconds
+    """
+
+    def __init__(self,
+                 batch_size: int = 50,
+                 idle_timeout: float = 30):
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._thread: Thread = None
+        self._lock = Lock()
+
+    def submit(self,
+               mail: EmailMessage)-> Future:
+        """
+        queue a message, the future resolves to the number of sent messages (1 or 0)
+        """
+        future = Future()
+        self._queue.put((mail, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="mail-dispatcher", daemon=True)
+                self._thread.start()
+        return future
+
+    def _run(self)-> None:
+        connection = None
+        while True:
+            try:
+                batch: list = [self._queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                for mail, future in batch:
+                    # Skip messages whose caller went away (cancelled future)
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(self._send(connection, mail))
+            except Exception as e:
+                logger.warning(f"mail dispatcher batch failed: {e}")
+                connection = None
+                # Fail the rest of the batch, never leave a caller waiting
+                for _, future in batch:
+                    if not future.done():
+                        if future.running() or future.set_running_or_notify_cancel():
+                            future.set_exception(e)
+
+    def _send(self,
+              connection,
+              mail: EmailMessage)-> int:
+        """
+        send over the open connection, reconnect once if the server dropped it
+        """
+        for _ in range(2):
+            try:
+                connection.open()
+                return connection.send_messages([mail])
+            except Exception as e:
+                logger.warning(f"failed to send mail to {mail.to}: {e}")
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+        return 0
+
+mail_dispatcher = MailDispatcher(batch_size=settings.EMAIL_DISPATCH_BATCH_SIZE,
+                                 idle_timeout=settings.EMAIL_DISPATCH_IDLE_TIMEOUT)
+
+async def asend_mail(subject: str,
+                     to: list,
+                     cc: list = None,
+                     bcc: list = None,
+                     template_message: str = None,
+                     body_message: str = None)-> int:
+    """
+    Send mail through the background dispatcher without blocking the event loop
+    """
+    mail = build_mail(subject=subject,
+                      to=to,
+                      cc=cc,
+                      bcc=bcc,
+                      template_message=template_message,
+                      body_message=body_message)
+    return await asyncio.wrap_future(mail_dispatcher.submit(mail))
+
+class PasswordHasherPool:
+    """
+    Size limited executor for password hashing
+    - PBKDF2 runs in `hashlib` with the GIL released, so worker threads hash in parallel
+      while the event loop keeps serving other requests
+    - at most `max_workers + queue_limit` hashes are running or waiting, extra
+      calls fail fast with 503 instead of piling up
+    """
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 queue_limit: int = 64):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._slots = BoundedSemaphore(max_workers + queue_limit)
+
+    async def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HttpError(status_code=503, message="server is busy, please try again")
+        future: Future = self._executor.submit(func, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+password_hasher = PasswordHasherPool(max_workers=settings.PASSWORD_HASHING_WORKERS,
+                                     queue_limit=settings.PASSWORD_HASHING_QUEUE_LIMIT)
+
+async def amake_password(password: str)-> str:
+    """
+    `make_password` on the password hasher pool
+    """
+    return await password_hasher.run(make_password, password)
+
+async def acheck_password(password: str,
+                          encoded: str)-> bool:
+    """
+    `check_password` on the password hasher pool
+    """
+    return await password_hasher.run(check_password, password, encoded)